@@ -2,4 +2,9 @@ from ._version import get_versions
 __version__ = get_versions()['version']
 del get_versions
 
-from .pyppeteer_pdf import save_pdf, main, PyppdfError
+from .pyppeteer_pdf import save_pdf, main, PyppdfError, RenderOptions, render_options
+from .pool import PagePool, BrowserPool
+from .intercept import FontCache
+from .scheduler import Scheduler, AdaptiveCapacity
+from .template import Template
+from .limits import MemoryBudget
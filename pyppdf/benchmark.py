@@ -0,0 +1,97 @@
+"""
+Render-time benchmarks. Usage example:
+
+python -m pyppdf.benchmark doc.html -n 10 --fonts ./fonts
+"""
+import asyncio
+import statistics
+import time
+from typing import Union, List, Tuple
+import click
+from .pyppeteer_pdf import render_options, RenderOptions
+from .pool import PagePool, warmup as warmup_
+from .launcher import launch, PROFILES
+
+
+async def bench(url: str, n: int=5, args: Union[str, dict, RenderOptions]=None,
+                pool_kwargs: dict=None, main_kwargs: dict=None,
+                warmup: List[str]=None) -> dict:
+    """
+    Launches a browser and renders ``url`` ``n`` times on the same
+    ``PagePool`` page. Returns seconds: ``launch`` (cold start),
+    ``first`` render, median of the ``nth`` (other) renders.
+    ``warmup`` scripts are loaded after the launch (see ``pool.warmup``)
+    and pages share the default browser context then.
+    """
+    opts = render_options(args)
+    _launch = opts.get('launch', {})
+    t = time.perf_counter()
+    browser = await launch(*_launch.args, **_launch.kwargs)
+    ret = dict(launch=time.perf_counter() - t)
+    pool_kwargs = dict(pool_kwargs or {})
+    if warmup:
+        await warmup_(browser, warmup, origin=url)
+        pool_kwargs.setdefault('incognito', False)
+    pool = PagePool(browser, size=1, **pool_kwargs)
+    times = []
+    try:
+        for _ in range(n):
+            t = time.perf_counter()
+            await pool.render(opts, url=url, returns=None, **(main_kwargs or {}))
+            times.append(time.perf_counter() - t)
+    finally:
+        await pool.close()
+        await browser.close()
+    ret['first'] = times[0]
+    ret['nth'] = statistics.median(times[1:]) if n > 1 else float('nan')
+    return ret
+
+
+def report(results: List[Tuple[str, dict]]) -> str:
+    lines = [f"{'variant':<24}{'launch, s':>12}{'first, s':>12}{'nth, s':>12}"]
+    for label, r in results:
+        lines.append(f"{label:<24}{r['launch']:>12.3f}{r['first']:>12.3f}{r['nth']:>12.3f}")
+    return '\n'.join(lines)
+
+
+@click.command(help="""Benchmarks cold start, first and n-th (median)
+render times of the PAGE (URL or file path). Every option adds
+a variant that is compared to the baseline.""")
+@click.argument('page', type=str)
+@click.option('-n', type=int, default=5, help='Number of renders per variant.')
+@click.option('-a', '--args', 'args_dict', type=str, default=None,
+              help='Same as pyppdf --args.')
+@click.option('-u', '--upd', 'args_upd', type=str, default=None,
+              help='Same as pyppdf --upd.')
+@click.option('-f', '--fonts', type=str, default=None,
+              help='Fonts directory variant (fonts served from memory).')
+@click.option('-w', '--warmup', type=str, multiple=True,
+              help='V8 code cache warmup variant: script URL or path to load ' +
+                   'before renders (like MathJax). Can be repeated.')
+@click.option('--pipe', is_flag=True, default=False,
+              help='CDP over pipes variant (--remote-debugging-pipe), ' +
+                   'compare on large PDFs.')
+@click.option('-l', '--launch-profile', 'profiles', type=click.Choice(list(PROFILES)),
+              multiple=True, help='Launch profile variant. Can be repeated.')
+def cli(page, n, args_dict, args_upd, fonts, warmup, pipe, profiles):
+    opts = render_options(args_dict, args_upd)
+    variants = [('baseline', dict())]
+    if fonts:
+        variants.append(('fonts', dict(pool_kwargs=dict(fonts=fonts))))
+    if warmup:
+        variants.append(('shared context', dict(pool_kwargs=dict(incognito=False))))
+        variants.append(('warmup', dict(warmup=list(warmup))))
+    if pipe:
+        variants.append(('pipe transport',
+                         dict(args=render_options(opts, dict(launch=dict(pipe=True))))))
+    for profile in profiles:
+        variants.append((profile,
+                         dict(args=render_options(opts, dict(launch=dict(profile=profile))))))
+    loop = asyncio.get_event_loop()
+    results = [(label, loop.run_until_complete(bench(page, n, kwargs.pop('args', opts), **kwargs)))
+               for label, kwargs in variants]
+    print(report(results))
+
+
+if __name__ == '__main__':
+    cli()
@@ -0,0 +1,219 @@
+import asyncio
+import hashlib
+import json
+import math
+import os
+import os.path as p
+import re
+import sys
+import traceback
+from typing import List, Dict, Tuple, Union
+from urllib.parse import urlparse, unquote
+from urllib.request import url2pathname
+import click
+from litereval import litereval
+from .pyppeteer_pdf import render_options, RenderOptions, PyppdfError
+from .pool import BrowserPool
+from .scheduler import Scheduler, AdaptiveCapacity
+from .limits import MemoryBudget, default_sizes, cpu_limit
+
+INDEX = '.pyppdf-index.json'
+# src/href attributes and CSS url():
+ASSET_RE = re.compile(r'''(?:\b(?:src|href)\s*=\s*["']|\burl\(\s*["']?)([^"'()\s]+)''',
+                      re.IGNORECASE)
+
+
+class Job:
+    """html file -> pdf file job of the build."""
+    def __init__(self, input_: str, output: str, options: RenderOptions):
+        self.input = input_
+        self.output = output
+        self.options = options
+
+
+def _sha256(file: str) -> str:
+    h = hashlib.sha256()
+    with open(file, 'rb') as f:
+        for chunk in iter(lambda: f.read(2**20), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def assets(html_file: str) -> List[str]:
+    """
+    Returns sorted absolute paths of existing local files that
+    ``html_file`` references via src/href attributes or CSS url().
+    """
+    with open(html_file, encoding='utf-8', errors='replace') as f:
+        text = f.read()
+    dir_ = p.dirname(html_file)
+    ret = set()
+    for ref in ASSET_RE.findall(text):
+        url = urlparse(ref)
+        if url.scheme == 'file':
+            path = url2pathname(unquote(url.path))
+        elif len(url.scheme) > 1:
+            continue
+        elif url.scheme:  # Windows drive
+            path = ref
+        else:
+            path = unquote(url.path)
+        path = p.normpath(p.join(dir_, path))
+        if p.isfile(path) and path != html_file:
+            ret.add(path)
+    return sorted(ret)
+
+
+def job_key(job: Job) -> str:
+    """Hash of the merged args, html file and local assets it references."""
+    h = hashlib.sha256(repr(job.options).encode('utf-8'))
+    for file in [job.input] + assets(job.input):
+        h.update(file.encode('utf-8'))
+        h.update(_sha256(file).encode('utf-8'))
+    return h.hexdigest()
+
+
+def load_manifest(manifest: str) -> Tuple[RenderOptions, List[Job]]:
+    """
+    Reads build manifest (litereval syntax). Returns common
+    options and jobs. Paths are relative to the manifest
+    directory. Example:
+
+    >>> # {args=None, upd="{emulateMedia='screen'}",
+    >>> #  jobs=[{input='ch1.html', output='pdf/ch1.pdf'},
+    >>> #        {input='ch2.html', output='pdf/ch2.pdf', upd='{waitFor=1000}'}]}
+    >>> #
+
+    ``args`` and ``upd`` are the same as ``args_dict`` and ``args_upd``
+    in 'save_pdf' function, job ``upd`` is merged into them
+    (``launch`` section is taken from the common options only).
+    """
+    root = p.dirname(p.abspath(manifest))
+    with open(manifest, encoding='utf-8') as f:
+        conf = litereval(f.read())
+    if not isinstance(conf, dict) or not isinstance(conf.get('jobs'), (list, tuple)):
+        raise PyppdfError(
+            f'Invalid pyppdf build manifest (should be a dict with jobs list): {manifest}')
+    options = render_options(conf.get('args'), conf.get('upd'))
+    jobs = [Job(p.normpath(p.join(root, job['input'])),
+                p.normpath(p.join(root, job['output'])),
+                render_options(options, job.get('upd')))
+            for job in conf['jobs']]
+    return options, jobs
+
+
+def _load_index(file: str) -> Dict[str, str]:
+    try:
+        with open(file, encoding='utf-8') as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {}
+
+
+def _save_index(file: str, index: Dict[str, str]):
+    temp = file + '.tmp'
+    with open(temp, 'w', encoding='utf-8') as f:
+        json.dump(index, f, indent=1, sort_keys=True)
+    os.replace(temp, file)
+
+
+async def build(manifest: str, jobs: Union[int, str]=None, force: bool=False) -> List[str]:
+    """
+    Renders only outdated PDFs of the ``manifest`` in parallel.
+    PDF is outdated if it's absent or the hash of the merged args,
+    html file and local assets it references differs from the one
+    stored in the index file (``.pyppdf-index.json`` next to the
+    manifest). Jobs start only when the projected Chromium RSS fits
+    the cgroup (or system) memory limit (see ``MemoryBudget``).
+    Returns paths of rendered PDFs.
+
+    Parameters
+    ----------
+    manifest :
+        Build manifest path (see ``load_manifest``).
+    jobs :
+        Number of parallel renders or ``'auto'``: adaptive number
+        (see ``AdaptiveCapacity``) up to twice the cgroup CPU quota
+        (or CPU count). By default it's sized from cgroup (or system)
+        memory and CPU limits.
+    force :
+        Render all PDFs.
+    """
+    index_file = p.join(p.dirname(p.abspath(manifest)), INDEX)
+    index = _load_index(index_file)
+    options, jobs_ = load_manifest(manifest)
+    outdated = []
+    for job in jobs_:
+        key = job_key(job)
+        if force or not p.isfile(job.output) or (index.get(job.output) != key):
+            outdated.append((job, key))
+    if not outdated:
+        return []
+
+    size, pages = default_sizes()
+    if jobs is None:
+        adaptive, max_jobs, jobs = None, size * pages, size * pages
+    elif jobs == 'auto':
+        adaptive = AdaptiveCapacity(max_=max(1, round(2 * cpu_limit())))
+        max_jobs, jobs = adaptive.max, max(1, adaptive.max // 4)
+    elif isinstance(jobs, int) and (jobs > 0):
+        adaptive, max_jobs = None, jobs
+    else:
+        raise ValueError(f"Invalid pyppdf `jobs` arg (should be positive int or 'auto'): {jobs}")
+    size = max(1, round(max_jobs / pages))
+    pool = BrowserPool(options, size=size, pages=math.ceil(max_jobs / size))
+    scheduler = Scheduler(pool, capacity=jobs, priorities=('bulk',), coalesce=False,
+                          adaptive=adaptive, memory=MemoryBudget())
+    done, failed = [], []
+
+    async def render(job: Job, key: str):
+        os.makedirs(p.dirname(job.output), exist_ok=True)
+        try:
+            await scheduler.render(job.options, url=job.input, output_file=job.output,
+                                   returns=None)
+        except Exception:
+            traceback.print_exc(file=sys.stderr)
+            failed.append(job.output)
+            return
+        index[job.output] = key
+        _save_index(index_file, index)
+        done.append(job.output)
+
+    async with pool:
+        await asyncio.gather(*(render(job, key) for job, key in outdated))
+    if failed:
+        raise PyppdfError('Failed to render:\n' + '\n'.join(failed))
+    return done
+
+
+def _jobs(ctx, param, value):
+    if value in (None, 'auto'):
+        return value
+    try:
+        if int(value) > 0:
+            return int(value)
+    except ValueError:
+        pass
+    raise click.BadParameter(f"should be positive int or 'auto': {value}")
+
+
+@click.command(help="""Renders only outdated PDFs of the build MANIFEST
+in parallel. Dependencies are tracked via hashes of the html file,
+local assets it references and merged args. The state is stored in
+the .pyppdf-index.json file next to the MANIFEST.
+
+MANIFEST example (litereval syntax, paths are relative to it):
+
+{args=None, upd="{emulateMedia='screen'}",
+jobs=[{input='ch1.html', output='pdf/ch1.pdf'},
+{input='ch2.html', output='pdf/ch2.pdf', upd='{waitFor=1000}'}]}
+""")
+@click.argument('manifest', type=str)
+@click.option('-j', '--jobs', type=str, default=None, callback=_jobs,
+              help="Number of parallel renders or 'auto' (adapts to the host). " +
+                   'Default is sized from cgroup (or system) memory and CPU limits.')
+@click.option('-f', '--force', is_flag=True, default=False,
+              help='Render all PDFs.')
+def cli(manifest, jobs, force):
+    for output in asyncio.get_event_loop().run_until_complete(build(manifest, jobs, force)):
+        print(output)
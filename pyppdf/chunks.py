@@ -0,0 +1,274 @@
+"""
+Parallel rendering of very long documents: the settled page is split
+to chunks at top-level section boundaries, chunks are printed on
+parallel pages and resulting PDFs are concatenated (needs ``pypdf``).
+"""
+import asyncio
+import pathlib
+import uuid
+from io import BytesIO
+from typing import List, Dict
+from urllib.parse import urlparse, urljoin, unquote
+from urllib.request import url2pathname
+from pyppeteer.page import Page
+from .pyppeteer_pdf import PyppdfError, _remove
+from .intercept import Interceptor, FontCache
+
+# language=JavaScript
+SPLIT_JS = '''(selector) => {
+    const attrs = (el) => Array.from(el.attributes).map(
+        (a) => ` ${a.name}="${a.value.replace(/&/g, '&amp;').replace(/"/g, '&quot;')}"`).join('');
+    const canvases = (el) => (el.nodeName === 'CANVAS') ? [el] :
+        (el.querySelectorAll ? Array.from(el.querySelectorAll('canvas')) : []);
+    const strip = (el) => {
+        const clone = el.cloneNode(true);
+        // cloneNode doesn't copy canvas bitmaps (and scripts that draw them are removed):
+        const originals = canvases(el);
+        let root = clone;
+        canvases(clone).forEach((canvas, i) => {
+            const img = document.createElement('img');
+            try {
+                img.src = originals[i].toDataURL();
+            } catch (e) {
+                return;  // tainted canvas
+            }
+            Array.from(canvas.attributes).forEach((a) => img.setAttribute(a.name, a.value));
+            const rect = originals[i].getBoundingClientRect();
+            img.style.width = `${rect.width}px`;
+            img.style.height = `${rect.height}px`;
+            if (canvas === clone) {
+                root = img;
+            } else {
+                canvas.replaceWith(img);
+            }
+        });
+        if (root.querySelectorAll) {
+            root.querySelectorAll('script').forEach((s) => s.remove());
+        }
+        return root;
+    };
+    const head = strip(document.head);
+    if (!head.querySelector('base')) {
+        const base = document.createElement('base');
+        base.href = document.baseURI;
+        head.prepend(base);
+    }
+    const starts = new Set(document.querySelectorAll(selector));
+    const chunks = [];
+    let current = [];
+    for (const node of Array.from(document.body.childNodes)) {
+        if (node.nodeName === 'SCRIPT') continue;
+        if (starts.has(node) && current.some((n) => n.nodeType === 1)) {
+            chunks.push(current);
+            current = [];
+        }
+        current.push(node);
+    }
+    if (current.length) chunks.push(current);
+    return {
+        head: `<!DOCTYPE html><html${attrs(document.documentElement)}>${head.outerHTML}` +
+              `<body${attrs(document.body)}>`,
+        tail: '</body></html>',
+        chunks: chunks.map((nodes) => {
+            const div = document.createElement('div');
+            nodes.forEach((n) => div.appendChild(strip(n)));
+            const h = div.querySelector('h1, h2, h3, h4, h5, h6');
+            return {title: h ? h.textContent.trim() : '', body: div.innerHTML};
+        }),
+    };
+}'''
+
+# ``#fragment`` links would resolve against the injected ``<base>``
+# (the source document) and become external links:
+# language=JavaScript
+FRAGMENTS_JS = '''() => document.querySelectorAll('a[href^="#"]').forEach(
+    (a) => { a.href = location.href.split('#')[0] + a.getAttribute('href'); })'''
+
+# language=JavaScript
+READY_JS = '''() => (document.readyState === 'complete') &&
+    Array.from(document.images).every((img) => img.complete) &&
+    (!document.fonts || (document.fonts.status === 'loaded'))'''
+
+PAD_BEFORE = '<div style="break-after: page;"></div>'
+PAD_AFTER = '<div style="break-before: page;"></div>'
+
+
+def _pypdf():
+    try:
+        import pypdf
+    except ImportError:
+        raise PyppdfError('Chunked rendering needs pypdf: pip install pypdf')
+    return pypdf
+
+
+def page_count(pdf: bytes) -> int:
+    return len(_pypdf().PdfReader(BytesIO(pdf)).pages)
+
+
+def concat(pdfs: List[bytes], titles: List[str]) -> bytes:
+    """
+    Concatenates ``pdfs`` and adds a bookmark with non-empty
+    ``titles[i]`` for the first page of every ``pdfs[i]``.
+    """
+    pypdf = _pypdf()
+    writer = pypdf.PdfWriter()
+    for pdf, title in zip(pdfs, titles):
+        start = len(writer.pages)
+        writer.append(pypdf.PdfReader(BytesIO(pdf)))
+        if title:
+            writer.add_outline_item(title, start)
+    out = BytesIO()
+    writer.write(out)
+    return out.getvalue()
+
+
+def _numbered(pdf: dict) -> bool:
+    """Whether header/footer templates show page numbers."""
+    if not pdf.get('displayHeaderFooter'):
+        return False
+    templates = (pdf.get('headerTemplate'), pdf.get('footerTemplate'))
+    # Chromium default templates show page numbers:
+    return any((t is None) or ('pageNumber' in t) or ('totalPages' in t)
+               for t in templates)
+
+
+class _ChunkUrls:
+    """
+    Chunk documents are loaded from the origin of the source page
+    so relative (and ``file://``) subresources keep loading: chunks
+    of a local file are written next to it, chunks of an http(s)
+    page are served from memory (via request interception) at URLs
+    next to it. Other pages (``setContent``) get chunks via
+    ``setContent`` too.
+    """
+    def __init__(self, url: str):
+        scheme = urlparse(url).scheme
+        self.mode = {'file': 'file', 'http': 'served', 'https': 'served'}.get(scheme)
+        self.url = url
+        self.prefix = f'.pyppdf-chunk-{uuid.uuid4().hex[:12]}-'
+        self.responses: Dict[str, dict] = {}
+        self.files: List[str] = []
+
+    def add(self, name: str, html: str) -> str:
+        """Registers chunk ``html``, returns its URL (or None)."""
+        if self.mode is None:
+            return None
+        url = urljoin(self.url, self.prefix + name + '.html')
+        if self.mode == 'file':
+            file = url2pathname(unquote(urlparse(url).path))
+            try:
+                with open(file, 'w', encoding='utf-8') as f:
+                    f.write(html)
+            except OSError as e:
+                raise PyppdfError(f'Chunks of a local file are written next to it: {e}')
+            self.files.append(file)
+            return pathlib.Path(file).as_uri()
+        self.responses[url] = dict(status=200, contentType='text/html; charset=utf-8',
+                                   body=html.encode('utf-8'))
+        return url
+
+    def remove(self):
+        for file in self.files:
+            _remove(file)
+
+
+async def _print_all(page: Page, htmls: List[str], pdfs: List[dict],
+                     emulateMedia: tuple, jobs: int, urls: _ChunkUrls,
+                     fonts: FontCache=None) -> List[bytes]:
+    context = page.target.browserContext
+    queue = list(range(len(htmls)))
+    ret: List[bytes] = [b''] * len(htmls)
+    round_ = len(urls.files) + len(urls.responses)
+    chunk_urls = [urls.add(str(round_ + i), html) for i, html in enumerate(htmls)]
+
+    async def worker():
+        page_ = await context.newPage()
+        interceptor = None
+        try:
+            if (urls.mode == 'served') or (fonts is not None):
+                interceptor = Interceptor(*([fonts.response] if fonts is not None else []))
+                interceptor.responses.update(urls.responses)
+                await interceptor.attach(page_)
+            if page.viewport:
+                await page_.setViewport(page.viewport)
+            if emulateMedia.args is not None:
+                await page_.emulateMedia(*emulateMedia.args, **emulateMedia.kwargs)
+            while queue:
+                i = queue.pop(0)
+                if chunk_urls[i] is None:
+                    await page_.setContent(htmls[i])
+                else:
+                    await page_.goto(chunk_urls[i], waitUntil='load')
+                await page_.waitForFunction(READY_JS)
+                await page_.evaluate(FRAGMENTS_JS)
+                ret[i] = await page_.pdf(**pdfs[i])
+        finally:
+            if interceptor is not None:
+                interceptor.remove_listener()
+            await page_.close()
+
+    await asyncio.gather(*(worker() for _ in range(max(1, min(jobs, len(htmls))))))
+    return ret
+
+
+async def print_chunks(page: Page, pdf: dict, emulateMedia: tuple,
+                       selector: str='body > section, body > h1',
+                       jobs: int=4, fonts: FontCache=None) -> bytes:
+    """
+    Splits settled ``page`` to chunks, prints them in parallel
+    and returns concatenated PDF bytes. Chunks are static snapshots
+    of the settled DOM (scripts are removed so they are not run
+    twice, canvases are converted to images). Chunks are loaded
+    from the origin of the ``page`` (see ``_ChunkUrls``) so local
+    and relative assets keep working. Every top-level node that
+    matches ``selector`` starts a new chunk. First heading of a chunk
+    becomes a bookmark. ``#fragment`` links work inside a chunk.
+    Page numbers in header/footer templates stay correct: chunks
+    are printed again with blank padding pages and ``pageRanges``.
+
+    Parameters
+    ----------
+    page :
+        Loaded page.
+    pdf :
+        ``page.pdf`` kwargs (``path`` is honored, ``pageRanges``
+        is not supported).
+    emulateMedia :
+        ``Args`` for ``page.emulateMedia`` of chunk pages.
+    selector :
+        CSS selector of the chunk starts.
+    jobs :
+        Number of parallel pages.
+    fonts :
+        Same as in 'main' function.
+    """
+    pdf = dict(pdf)
+    path = pdf.pop('path', None)
+    if pdf.get('pageRanges'):
+        raise PyppdfError('pageRanges pdf option is not supported in chunks mode.')
+    split = await page.evaluate(SPLIT_JS, selector)
+    head, tail, chunks = split['head'], split['tail'], split['chunks']
+    titles = [c['title'] for c in chunks]
+    htmls = [head + c['body'] + tail for c in chunks]
+
+    urls = _ChunkUrls(page.url)
+    try:
+        ret = await _print_all(page, htmls, [pdf] * len(htmls), emulateMedia, jobs, urls, fonts)
+        if _numbered(pdf) and len(chunks) > 1:
+            counts = [page_count(b) for b in ret]
+            total = sum(counts)
+            htmls, pdfs, before = [], [], 0
+            for c, n in zip(chunks, counts):
+                after = total - before - n
+                htmls.append(head + PAD_BEFORE * before + c['body'] + PAD_AFTER * after + tail)
+                pdfs.append(dict(pdf, pageRanges=f'{before + 1}-{before + n}'))
+                before += n
+            ret = await _print_all(page, htmls, pdfs, emulateMedia, jobs, urls, fonts)
+    finally:
+        urls.remove()
+
+    ret = concat(ret, titles)
+    if path:
+        with open(path, 'wb') as f:
+            f.write(ret)
+    return ret
@@ -0,0 +1,123 @@
+import asyncio
+import base64
+import os
+import os.path as p
+from functools import lru_cache
+from typing import Dict, Callable, Union
+from urllib.parse import urlparse, unquote
+from pyppeteer.page import Page
+
+# .invalid TLD never resolves so nothing leaks to network:
+# http: (not https:) so http:// assets are not blocked as mixed content
+# (like with the opaque origin of the former data: document):
+DOC_URL = 'http://pyppdf.invalid/index.html'
+FONT_TYPES = {'.woff2': 'font/woff2', '.woff': 'font/woff', '.ttf': 'font/ttf', '.otf': 'font/otf'}
+
+
+class FontCache:
+    """
+    Fonts from ``dir_`` that are read once and served from memory
+    (via request interception) instead of any font request with the
+    same file name. Helps for http(s) fonts (and relative fonts of
+    html that is not a file), ``data:`` fonts are in memory anyway. Register it once per
+    browser pool (see ``font_cache``).
+    """
+    def __init__(self, dir_: str):
+        self.dir = p.abspath(dir_)
+        self.fonts: Dict[str, dict] = {}
+        for name in os.listdir(self.dir):
+            content_type = FONT_TYPES.get(p.splitext(name)[1].lower())
+            if content_type is None:
+                continue
+            with open(p.join(self.dir, name), 'rb') as f:
+                self.fonts[name] = dict(
+                    status=200, contentType=content_type, body=f.read(),
+                    headers={'Access-Control-Allow-Origin': '*',
+                             'Cache-Control': 'public, max-age=31536000'})
+
+    def response(self, url: str) -> Union[dict, None]:
+        if url.startswith('data:'):
+            return None
+        return self.fonts.get(unquote(urlparse(url).path).rsplit('/', 1)[-1])
+
+
+@lru_cache(maxsize=None)
+def font_cache(dir_: str) -> FontCache:
+    """Returns memoized ``FontCache`` of the ``dir_``."""
+    return FontCache(dir_)
+
+
+def _escape(url: str) -> str:
+    """Escapes ``Fetch`` URL pattern wildcards."""
+    return url.replace('\\', '\\\\').replace('*', '\\*').replace('?', '\\?')
+
+
+class Interceptor:
+    """
+    Request interception handler of a page: fulfills requests
+    to the registered URLs (or font requests resolved by ``resolvers``
+    that return response dict or None) with in-memory responses.
+    Uses CDP ``Fetch`` domain with URL and resource type patterns so
+    only these requests are paused: other requests don't get extra
+    round trips and HTTP cache stays enabled (unlike
+    ``page.setRequestInterception``).
+    """
+    def __init__(self, *resolvers: Callable[[str], Union[dict, None]]):
+        self.responses: Dict[str, dict] = {}
+        self.resolvers = resolvers
+        self._page = None
+        self._listening = False
+
+    def serve(self, url: str, body: bytes, content_type: str):
+        """Registers in-memory ``body`` as a response for ``url``."""
+        self.responses[url] = dict(status=200, contentType=content_type, body=body)
+
+    async def attach(self, page: Page):
+        """Registered URLs should be served before the call."""
+        self._page = page
+        page._client.on('Fetch.requestPaused', self._on_request)
+        self._listening = True
+        patterns = [dict(urlPattern=_escape(url), requestStage='Request')
+                    for url in self.responses]
+        if self.resolvers:
+            patterns.append(dict(urlPattern='*', resourceType='Font', requestStage='Request'))
+        await page._client.send('Fetch.enable', dict(patterns=patterns))
+
+    def remove_listener(self):
+        """Synchronous part of ``detach`` (safe on cancellation)."""
+        if self._listening:
+            self._page._client.remove_listener('Fetch.requestPaused', self._on_request)
+            self._listening = False
+
+    async def detach(self):
+        """Disables interception so later requests are not stalled."""
+        self.remove_listener()
+        page, self._page = self._page, None
+        if (page is not None) and not page.isClosed():
+            await page._client.send('Fetch.disable')
+
+    def _on_request(self, event: dict):
+        asyncio.ensure_future(self._handle(self._page._client, event))
+
+    async def _handle(self, client, event: dict):
+        url = event['request']['url']
+        response = self.responses.get(url)
+        for resolve in self.resolvers:
+            if response is not None:
+                break
+            response = resolve(url)
+        try:
+            if response is None:
+                await client.send('Fetch.continueRequest', dict(requestId=event['requestId']))
+            else:
+                if '_fetch' not in response:  # encoded once for all requests
+                    headers = dict(response.get('headers', {}),
+                                   **{'Content-Type': response['contentType']})
+                    response['_fetch'] = dict(
+                        responseCode=response['status'],
+                        responseHeaders=[dict(name=k, value=v) for k, v in headers.items()],
+                        body=base64.b64encode(response['body']).decode('ascii'))
+                await client.send('Fetch.fulfillRequest',
+                                  dict(response['_fetch'], requestId=event['requestId']))
+        except Exception:
+            pass  # page is closed or request is already handled
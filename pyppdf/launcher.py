@@ -0,0 +1,212 @@
+"""
+Browser launch with optional CDP transport over pipes
+(``--remote-debugging-pipe``) instead of the websocket
+and named launch profiles (sets of Chromium flags).
+"""
+import asyncio
+import atexit
+import os
+import shutil
+import subprocess
+import sys
+from typing import Union, List
+from pyppeteer import launch as ws_launch
+from pyppeteer.browser import Browser
+from pyppeteer.connection import Connection
+from pyppeteer.launcher import Launcher
+from pyppeteer.util import merge_dict
+
+
+# Chromium flags for PDF-only workloads (no GPU compositing, extensions,
+# background services and updates are needed to print documents):
+_HEADLESS_PRINT = [
+    '--disable-gpu',
+    '--disable-extensions',
+    '--disable-background-networking',
+    '--disable-component-update',
+    '--disable-default-apps',
+    '--disable-sync',
+    '--disable-breakpad',
+    '--disable-domain-reliability',
+    '--no-default-browser-check',
+    '--no-first-run',
+    '--mute-audio',
+]
+PROFILES = {
+    'fast-print': _HEADLESS_PRINT + [
+        '--disable-renderer-backgrounding',
+        '--disable-background-timer-throttling',
+        '--disable-backgrounding-occluded-windows',
+        '--disable-ipc-flooding-protection',
+    ],
+    # '--disable-dev-shm-usage' is added when /dev/shm is small
+    # (64 MiB Docker default) so renderers don't crash:
+    'container': _HEADLESS_PRINT,
+}
+SMALL_SHM = 512 * 2**20
+
+
+def _small_shm() -> bool:
+    try:
+        return shutil.disk_usage('/dev/shm').total < SMALL_SHM
+    except OSError:
+        return False
+
+
+def profile_args(profile: Union[str, List[str]]) -> List[str]:
+    """Chromium flags of the named launch ``profile`` (or profiles)."""
+    names = [profile] if isinstance(profile, str) else list(profile)
+    ret: List[str] = []
+    for name in names:
+        if name not in PROFILES:
+            raise ValueError(
+                f'Invalid pyppdf launch `profile` (should be one of {tuple(PROFILES)}): {name}')
+        ret += [arg for arg in PROFILES[name] if arg not in ret]
+        if (name == 'container') and _small_shm() and ('--disable-dev-shm-usage' not in ret):
+            ret.append('--disable-dev-shm-usage')
+    return ret
+
+
+class _PipeProtocol(asyncio.Protocol):
+    """Splits CDP messages that Chromium separates with NUL bytes."""
+    def __init__(self, queue: asyncio.Queue):
+        self.queue = queue
+        self.buffer = bytearray()
+
+    def data_received(self, data: bytes):
+        self.buffer.extend(data)
+        start = 0
+        while True:
+            end = self.buffer.find(b'\0', start)
+            if end < 0:
+                break
+            self.queue.put_nowait(self.buffer[start:end].decode('utf-8'))
+            start = end + 1
+        del self.buffer[:start]
+
+    def connection_lost(self, exc):
+        self.queue.put_nowait(None)
+
+
+class PipeTransport:
+    """
+    Websocket-like ``recv``/``send``/``close`` interface over
+    the pipes of a ``--remote-debugging-pipe`` Chromium.
+    """
+    def __init__(self, read_fd: int, write_fd: int, loop: asyncio.AbstractEventLoop):
+        self.read_fd = read_fd
+        self.write_fd = write_fd
+        self.loop = loop
+        self.queue: asyncio.Queue = asyncio.Queue()
+        self.reader = self.writer = None
+
+    async def __aenter__(self) -> 'PipeTransport':
+        self.reader, _ = await self.loop.connect_read_pipe(
+            lambda: _PipeProtocol(self.queue), os.fdopen(self.read_fd, 'rb', buffering=0))
+        self.writer, _ = await self.loop.connect_write_pipe(
+            asyncio.Protocol, os.fdopen(self.write_fd, 'wb', buffering=0))
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def recv(self) -> str:
+        message = await self.queue.get()
+        if message is None:
+            raise ConnectionResetError('Browser pipe is closed.')
+        return message
+
+    async def send(self, message: str):
+        if self.writer.is_closing():
+            raise ConnectionResetError('Browser pipe is closed.')
+        self.writer.write(message.encode('utf-8') + b'\0')
+
+    async def close(self):
+        for transport in (self.writer, self.reader):
+            if transport is not None:
+                transport.close()
+
+
+class PipeConnection(Connection):
+    """pyppeteer ``Connection`` that talks CDP over ``PipeTransport``."""
+    # noinspection PyMissingConstructor
+    def __init__(self, read_fd: int, write_fd: int, loop: asyncio.AbstractEventLoop,
+                 delay: int=0):
+        super(Connection, self).__init__()  # EventEmitter
+        self._url = 'pipe:'
+        self._lastId = 0
+        self._callbacks = dict()
+        self._delay = delay / 1000
+        self._loop = loop
+        self._sessions = dict()
+        self._connected = False
+        self._ws = PipeTransport(read_fd, write_fd, loop)
+        self._recv_fut = self._loop.create_task(self._recv_loop())
+        self._closeCallback = None
+
+
+def _child_fds(read_fd: int, write_fd: int):
+    """``preexec_fn`` that puts pipe ends to fds 3 and 4 of Chromium."""
+    import fcntl
+
+    def preexec():
+        read_fd_ = fcntl.fcntl(read_fd, fcntl.F_DUPFD_CLOEXEC, 10)
+        write_fd_ = fcntl.fcntl(write_fd, fcntl.F_DUPFD_CLOEXEC, 10)
+        os.dup2(read_fd_, 3)
+        os.dup2(write_fd_, 4)
+    return preexec
+
+
+async def launch_pipe(options: dict=None, **kwargs) -> Browser:
+    """
+    Same as ``pyppeteer.launch`` but Chromium is launched with
+    ``--remote-debugging-pipe`` and CDP messages go over inherited
+    pipes: no port allocation, no TCP and websocket framing
+    (large ``page.pdf`` payloads). POSIX only.
+    """
+    if sys.platform.startswith('win'):
+        raise OSError('Pipe CDP transport is not supported on Windows.')
+    options = merge_dict(options, kwargs)
+    options['args'] = [arg for arg in options.get('args', [])
+                       if not arg.startswith('--remote-debugging-')] + ['--remote-debugging-pipe']
+    launcher = Launcher(options)
+    loop = launcher._loop
+    chrome_read, write_fd = os.pipe()
+    read_fd, chrome_write = os.pipe()
+    try:
+        proc = subprocess.Popen(
+            launcher.cmd, env=launcher.env, close_fds=False,
+            preexec_fn=_child_fds(chrome_read, chrome_write),
+            **({} if launcher.dumpio else
+               dict(stdout=subprocess.DEVNULL, stderr=subprocess.STDOUT)))
+    except Exception:
+        for fd in (chrome_read, write_fd, read_fd, chrome_write):
+            os.close(fd)
+        raise
+    os.close(chrome_read)
+    os.close(chrome_write)
+    launcher.proc = proc
+    launcher.chromeClosed = False
+    launcher.connection = PipeConnection(read_fd, write_fd, loop, launcher.slowMo)
+    if launcher.autoClose:
+        atexit.register(lambda: launcher.waitForChromeToClose())
+    browser = await Browser.create(launcher.connection, [], launcher.ignoreHTTPSErrors,
+                                   launcher.defaultViewport, proc, launcher.killChrome)
+    await launcher.ensureInitialPage(browser)
+    return browser
+
+
+async def launch(options: dict=None, **kwargs) -> Browser:
+    """
+    ``pyppeteer.launch`` that also takes ``pipe`` option (if True
+    then ``launch_pipe`` is used) and ``profile`` option: name (or
+    list of names) of ``PROFILES`` which flags are added to ``args``.
+    """
+    options = merge_dict(options, kwargs)
+    profile = options.pop('profile', None)
+    if profile:
+        args = list(options.get('args', []))
+        options['args'] = args + [arg for arg in profile_args(profile) if arg not in args]
+    if options.pop('pipe', False):
+        return await launch_pipe(options)
+    return await ws_launch(options)
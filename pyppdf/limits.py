@@ -0,0 +1,198 @@
+"""
+cgroup v1/v2 aware memory and CPU limits (containers, Kubernetes pods)
+for default pool sizes and memory-aware admission of jobs.
+"""
+import math
+import os
+import os.path as p
+import time
+from typing import Union, Tuple
+import psutil
+
+CGROUP = '/sys/fs/cgroup'
+PROC_CGROUP = '/proc/self/cgroup'
+# Rough RSS estimates of a Chromium browser (browser, GPU, network
+# processes) and of a page that renders a document:
+BROWSER_RSS = 150 * 2**20
+PAGE_RSS = 100 * 2**20
+# v1 reports "no limit" as a huge page-aligned number:
+_NO_LIMIT = 2**60
+
+
+def _read(*path: str) -> Union[str, None]:
+    try:
+        with open(p.join(*path)) as f:
+            return f.read().strip()
+    except (OSError, ValueError):
+        return None
+
+
+def _cgroup_dirs(controller: str):
+    """
+    Candidate cgroup directories of this process for the v1
+    ``controller`` (and the v2 unified hierarchy) from the most
+    specific to the root one.
+    """
+    v1, v2 = [], []
+    for line in (_read(PROC_CGROUP) or '').splitlines():
+        _, controllers, path = line.split(':', 2)
+        path = path.lstrip('/')
+        if controllers == '':
+            v2.append(p.join(CGROUP, path))
+        elif controller in controllers.split(','):
+            v1.append(p.join(CGROUP, controllers, path))
+            v1.append(p.join(CGROUP, controller, path))
+    return v2 + [CGROUP], v1 + [p.join(CGROUP, controller)]
+
+
+def memory_limit() -> int:
+    """Memory limit of the cgroup or total system memory in bytes."""
+    ret = psutil.virtual_memory().total
+    v2, v1 = _cgroup_dirs('memory')
+    for value in [_read(dir_, 'memory.max') for dir_ in v2] + [
+            _read(dir_, 'memory.limit_in_bytes') for dir_ in v1]:
+        if value and value.isdigit() and (int(value) < _NO_LIMIT):
+            return min(ret, int(value))
+    return ret
+
+
+def _stat(dir_: str, file: str, key: str) -> Union[int, None]:
+    """Value of ``key`` in flat keyed cgroup ``file`` like ``memory.stat``."""
+    for line in (_read(dir_, file) or '').splitlines():
+        name, _, value = line.partition(' ')
+        if (name == key) and value.isdigit():
+            return int(value)
+    return None
+
+
+def memory_usage() -> int:
+    """
+    Memory usage of the cgroup without reclaimable page cache
+    (like ``docker stats`` and kubelet working set) or used system
+    memory in bytes.
+    """
+    v2, v1 = _cgroup_dirs('memory')
+    if memory_limit() < psutil.virtual_memory().total:
+        for dirs, file, key in ((v2, 'memory.current', 'inactive_file'),
+                                (v1, 'memory.usage_in_bytes', 'total_inactive_file')):
+            for dir_ in dirs:
+                value = _read(dir_, file)
+                if value and value.isdigit():
+                    return max(0, int(value) - (_stat(dir_, 'memory.stat', key) or 0))
+    vm = psutil.virtual_memory()
+    return vm.total - vm.available
+
+
+def memory_percent() -> float:
+    """Used memory percent of the cgroup limit (or of the system)."""
+    return 100 * memory_usage() / memory_limit()
+
+
+def cpu_limit() -> float:
+    """CPU quota of the cgroup or number of usable CPUs."""
+    try:
+        ret = float(len(os.sched_getaffinity(0)))
+    except AttributeError:
+        ret = float(os.cpu_count() or 1)
+    v2, v1 = _cgroup_dirs('cpu')
+    for dir_ in v2:
+        value = (_read(dir_, 'cpu.max') or '').split()
+        if len(value) == 2 and value[0] != 'max':
+            return min(ret, int(value[0]) / int(value[1]))
+    for dir_ in v1:
+        quota, period = _read(dir_, 'cpu.cfs_quota_us'), _read(dir_, 'cpu.cfs_period_us')
+        if quota and period and quota.isdigit() and period.isdigit():  # -1 means no limit
+            return min(ret, int(quota) / int(period))
+    return ret
+
+
+def cpu_usage() -> Union[float, None]:
+    """CPU time used by the cgroup in seconds (None if unknown)."""
+    v2, _ = _cgroup_dirs('cpu')
+    for dir_ in v2:
+        value = _stat(dir_, 'cpu.stat', 'usage_usec')
+        if value is not None:
+            return value / 1e6
+    _, v1 = _cgroup_dirs('cpuacct')
+    for dir_ in v1:
+        value = _read(dir_, 'cpuacct.usage')
+        if value and value.isdigit():
+            return int(value) / 1e9
+    return None
+
+
+class CpuLoad:
+    """
+    CPU load percent since the previous measurement: the max of the
+    system load and the cgroup CPU usage relative to ``cpu_limit``
+    (a pod with a small CPU quota on a big node is loaded while
+    the system is not).
+    """
+    def __init__(self):
+        psutil.cpu_percent(None)  # starts system load measurement
+        self._last = (time.monotonic(), cpu_usage())
+
+    def percent(self) -> float:
+        ret = psutil.cpu_percent(None)
+        now, usage = time.monotonic(), cpu_usage()
+        (last, last_usage), self._last = self._last, (now, usage)
+        if (usage is not None) and (last_usage is not None) and (now > last):
+            ret = max(ret, 100 * (usage - last_usage) / (now - last) / cpu_limit())
+        return ret
+
+
+def default_sizes(pages_per_browser: int=4, page_rss: int=PAGE_RSS,
+                  browser_rss: int=BROWSER_RSS, reserve: float=0.2) -> Tuple[int, int]:
+    """
+    Returns number of browsers and pages per browser that fit
+    the cgroup (or system) memory and CPU limits: two pages per CPU
+    (pages wait for network and fonts too) while estimated RSS fits
+    memory without ``reserve`` fraction.
+    """
+    by_cpu = max(1, int(2 * cpu_limit()))
+    by_memory = int(memory_limit() * (1 - reserve) / (page_rss + browser_rss / pages_per_browser))
+    pages = max(1, min(by_cpu, by_memory))
+    browsers = math.ceil(pages / pages_per_browser)
+    return browsers, math.ceil(pages / browsers)
+
+
+class MemoryBudget:
+    """
+    Memory-aware admission control: a new job is admitted only if
+    the current cgroup (or system) memory usage plus ``page_rss``
+    (projected RSS of one more rendering page) fits the limit without
+    ``reserve`` fraction. Jobs admitted less than ``ramp`` seconds ago
+    are projected with ``page_rss`` too (their pages are still growing).
+    A job is always admitted when nothing runs.
+
+    Parameters
+    ----------
+    limit :
+        Memory limit in bytes. Default is the cgroup (or system) limit.
+    page_rss :
+        Projected RSS of a rendering page in bytes.
+    reserve :
+        Fraction of the limit that is kept free.
+    ramp :
+        Seconds after admission while a job is projected with ``page_rss``.
+    """
+    def __init__(self, limit: int=None, page_rss: int=PAGE_RSS, reserve: float=0.1,
+                 ramp: float=5):
+        self.limit = limit or memory_limit()
+        self.page_rss = page_rss
+        self.reserve = reserve
+        self.ramp = ramp
+        self._admitted = []
+
+    def fits(self, running: int=0) -> bool:
+        """Whether one more job fits when ``running`` jobs run."""
+        if running == 0:
+            return True
+        now = time.monotonic()
+        self._admitted = [t for t in self._admitted if now - t < self.ramp]
+        projected = memory_usage() + self.page_rss * (1 + len(self._admitted))
+        return projected <= self.limit * (1 - self.reserve)
+
+    def admit(self):
+        """Registers admitted job."""
+        self._admitted.append(time.monotonic())
@@ -0,0 +1,554 @@
+import asyncio
+import os
+import os.path as p
+import pathlib
+import shutil
+import socket
+import sys
+import tempfile
+import traceback
+from urllib.parse import urljoin, urlsplit
+import psutil
+from typing import Union, List, Dict, BinaryIO
+from .launcher import launch
+from .limits import default_sizes
+from pyppeteer.browser import Browser, BrowserContext
+from pyppeteer.page import Page
+from .intercept import Interceptor, FontCache, font_cache
+from .pyppeteer_pdf import main, RenderOptions, render_options, PyppdfError, _reap
+
+
+def _origin(url: str) -> Union[str, None]:
+    """Origin of the http(s) ``url`` (None for other schemes)."""
+    parts = urlsplit(url)
+    return f'{parts.scheme}://{parts.netloc}' if parts.scheme in ('http', 'https') else None
+
+
+class PagePool:
+    """
+    Pool of reusable pages of an already running browser.
+    By default every page lives in its own incognito browser context.
+    After a job the page is reset: navigated to ``about:blank``,
+    cookies and storage of all origins that the page and its frames
+    (like third-party iframes) visited are cleared, media emulation
+    and viewport are restored to defaults. Pages are retired (closed
+    with their context) after ``max_uses`` jobs, when JS heap grows
+    above ``max_heap`` or when a job fails or is cancelled.
+
+    Parameters
+    ----------
+    browser :
+        Running pyppeteer browser.
+    size :
+        Max number of pages that are used at once.
+    max_uses :
+        Number of jobs after which the page is retired.
+    max_heap :
+        Used JS heap size in bytes after which the page is retired.
+    fonts :
+        Fonts directory or ``FontCache`` that is used by all jobs
+        of the pool (default for the ``fonts`` arg of 'main').
+    incognito :
+        If False then pages share the default browser context with
+        its warm HTTP and V8 code caches (incognito contexts have
+        their own empty caches). Cookies and storage of the visited
+        origins are still cleared.
+    """
+    def __init__(self, browser: Browser, size: int=4, max_uses: int=50,
+                 max_heap: int=256 * 2**20, fonts: Union[str, FontCache]=None,
+                 incognito: bool=True):
+        self.browser = browser
+        self.size = size
+        self.max_uses = max_uses
+        self.max_heap = max_heap
+        self.fonts = (font_cache(p.abspath(p.expanduser(fonts))) if isinstance(fonts, str)
+                      else fonts)
+        self.incognito = incognito
+        self._sem = asyncio.Semaphore(size)
+        self._idle: List[Page] = []
+        self._uses: Dict[Page, int] = {}
+        self._contexts: Dict[Page, BrowserContext] = {}
+        self._origins: Dict[Page, set] = {}
+        self._viewport: Union[dict, None] = None
+
+    async def acquire(self) -> Page:
+        """Waits for a free slot and returns idle or new page."""
+        await self._sem.acquire()
+        try:
+            if self._idle:
+                return self._idle.pop()
+            if self.incognito:
+                context = await self.browser.createIncognitoBrowserContext()
+                page = await context.newPage()
+                self._contexts[page] = context
+            else:
+                page = await self.browser.newPage()
+            if self._viewport is None:
+                self._viewport = page.viewport
+            self._uses[page] = 0
+            origins = self._origins[page] = set()
+            page.on('framenavigated', lambda frame: origins.add(_origin(frame.url)))
+            return page
+        except Exception:
+            self._sem.release()
+            raise
+
+    async def release(self, page: Page, retire: bool=False):
+        """Resets ``page`` and returns it to the pool (or retires it)."""
+        try:
+            self._uses[page] += 1
+            if retire or (self._uses[page] >= self.max_uses) or not await self._reset(page):
+                await self._retire(page)
+            else:
+                self._idle.append(page)
+        finally:
+            self._sem.release()
+
+    async def _reset(self, page: Page) -> bool:
+        """Returns False if the page should be retired."""
+        try:
+            if page.isClosed():
+                return False
+            metrics = await page.metrics()
+            if metrics.get('JSHeapUsedSize', 0) > self.max_heap:
+                return False
+            origins = self._origins[page]
+            origins.add(await page.evaluate('location.origin', force_expr=True))
+            await page.goto('about:blank')
+            # noinspection PyProtectedMember
+            client = page._client
+            if self.incognito:
+                await client.send('Network.clearBrowserCookies')
+            for origin in origins - {None, '', 'null'}:
+                await client.send('Storage.clearDataForOrigin',
+                                  {'origin': origin, 'storageTypes': 'all'})
+            origins.clear()
+            await page.emulateMedia(None)
+            if self._viewport:
+                await page.setViewport(self._viewport)
+            return True
+        except Exception:
+            return False
+
+    async def _retire(self, page: Page):
+        self._uses.pop(page, None)
+        self._origins.pop(page, None)
+        context = self._contexts.pop(page, None)
+        try:
+            if context is not None:
+                await context.close()
+            else:
+                await page.close()
+        except Exception:
+            pass
+
+    async def render(self, args: Union[dict, RenderOptions],
+                     **kwargs) -> Union[bytes, BinaryIO, None]:
+        """
+        Same as ``main`` but uses a page from the pool.
+        ``kwargs`` are passed to ``main``.
+        """
+        kwargs.setdefault('fonts', self.fonts)
+        page = await self.acquire()
+        retire = True  # also on cancellation
+        try:
+            ret = await main(args, page=page, **kwargs)
+            retire = False
+            return ret
+        finally:
+            # the slot is released even if the caller is cancelled again:
+            await asyncio.shield(self.release(page, retire=retire))
+
+    async def close(self):
+        """Retires all idle pages. Browser is not closed."""
+        idle, self._idle = self._idle, []
+        for page in idle:
+            await self._retire(page)
+
+
+WARMUP_HTML = b'<!DOCTYPE html><html><head><meta charset="utf-8"></head><body></body></html>'
+
+
+async def warmup(browser: Browser, scripts: List[str], runs: int=3, origin: str=None):
+    """
+    Loads ``scripts`` (URLs or file paths) ``runs`` times on a page
+    of the default browser context so that V8 code cache of the
+    profile is populated (V8 caches compiled code of http(s) scripts
+    that were run several times). Scripts are loaded from a stub page
+    on the ``origin`` of the documents (caches are partitioned by the
+    page site and ``about:blank`` can't load ``file://`` scripts):
+    http(s) stub is served from memory, ``file://`` stub is a temp
+    file. Default origin is the origin of every script. Scripts that
+    fail to load are reported to stderr.
+    """
+    urls = [pathlib.Path(script).absolute().as_uri() if p.isfile(script) else script
+            for script in scripts]
+    page = await browser.newPage()
+    interceptor = Interceptor()
+    stub_dir = tempfile.mkdtemp(prefix='pyppdf-warmup-')
+    stubs: Dict[str, List[str]] = {}
+    for url in urls:
+        base = origin or url
+        if urlsplit(base).scheme in ('http', 'https'):
+            stub = urljoin(base, '/.pyppdf-warmup.html')
+            interceptor.serve(stub, WARMUP_HTML, 'text/html; charset=utf-8')
+        else:
+            stub = pathlib.Path(stub_dir, 'warmup.html').as_uri()
+        stubs.setdefault(stub, []).append(url)
+    try:
+        with open(p.join(stub_dir, 'warmup.html'), 'wb') as f:
+            f.write(WARMUP_HTML)
+        if interceptor.responses:
+            await interceptor.attach(page)
+        failed = set()
+        for _ in range(runs):
+            for stub, urls_ in stubs.items():
+                await page.goto(stub)
+                for url in urls_:
+                    try:
+                        await page.addScriptTag(url=url)
+                    except Exception as e:
+                        if url not in failed:
+                            failed.add(url)
+                            print(f'pyppdf warmup: failed to load {url} on {stub}: {e}',
+                                  file=sys.stderr)
+    finally:
+        interceptor.remove_listener()
+        shutil.rmtree(stub_dir, ignore_errors=True)
+        await page.close()
+
+
+class _Worker:
+    """Browser with its page pool, profile slot (and its lock) and health state."""
+    def __init__(self, browser: Browser, pages: PagePool, slot: int, lock: int=None):
+        self.browser = browser
+        self.pages = pages
+        self.slot = slot
+        self.lock = lock
+        self.active = 0
+        self.serving = True
+
+
+# Chromium profile subdirectories that are safe to delete:
+CACHE_DIRS = ('Cache', 'Code Cache', 'GPUCache', p.join('Default', 'Cache'),
+              p.join('Default', 'Code Cache'), p.join('Default', 'GPUCache'))
+LOCK_FILES = ('SingletonLock', 'SingletonSocket', 'SingletonCookie')
+# held by pyppdf while the browser of the profile lives:
+PROFILE_LOCK = 'pyppdf.lock'
+
+
+def _lock_profile(profile: str) -> Union[int, None]:
+    """
+    Takes exclusive ``flock`` of the profile so that other pyppdf
+    processes don't share it. Returns lock file descriptor (None if
+    ``fcntl`` is not available).
+    """
+    try:
+        import fcntl
+    except ImportError:
+        return None
+    fd = os.open(p.join(profile, PROFILE_LOCK), os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        os.close(fd)
+        raise PyppdfError(f'Browser profile is used by another pyppdf process: {profile}')
+    return fd
+
+
+def _unlock_profile(fd: Union[int, None]):
+    if fd is not None:
+        os.close(fd)  # releases flock
+
+
+def _singleton_owner(profile: str) -> Union[int, None]:
+    """
+    PID of the live Chromium on this host that owns the profile
+    according to ``SingletonLock`` symlink (``<hostname>-<pid>``).
+    Locks of other hosts are stale for the ``pyppdf.lock`` holder
+    (container hostnames change on every restart).
+    """
+    try:
+        target = os.readlink(p.join(profile, 'SingletonLock'))
+    except OSError:
+        return None
+    host, _, pid = target.rpartition('-')
+    if not pid.isdigit():
+        return None
+    if host != socket.gethostname():
+        return None
+    return int(pid) if psutil.pid_exists(int(pid)) else None
+
+
+def _cache_size(profile: str) -> int:
+    ret = 0
+    for dir_ in CACHE_DIRS:
+        for root, _, files in os.walk(p.join(profile, dir_)):
+            for file in files:
+                try:
+                    ret += os.lstat(p.join(root, file)).st_size
+                except OSError:
+                    pass
+    return ret
+
+
+class BrowserPool:
+    """
+    Pool of launched browsers for long-lived use. Every browser
+    serves jobs via its own ``PagePool``. A watchdog checks browsers
+    every ``interval`` seconds: RSS of the browser process tree,
+    number of open targets and whether a CDP call answers in
+    ``cdp_timeout`` seconds. Unhealthy browser stops getting new
+    jobs, is drained (in-flight jobs get ``drain_timeout`` seconds)
+    and restarted in background while other browsers keep serving.
+
+    Parameters
+    ----------
+    args :
+        Same as ``args_dict`` in 'save_pdf' function. Only ``launch``
+        section is used (jobs bring their own options).
+    size :
+        Number of browsers.
+    pages :
+        Max number of pages that are used at once by every browser.
+        If ``size`` or ``pages`` is None then both are sized from
+        cgroup (or system) memory and CPU limits (see
+        ``pyppdf.limits.default_sizes``) so pods with small memory
+        limits are not OOM-killed.
+    max_rss :
+        Max RSS of the browser process tree in bytes.
+    max_targets :
+        Max number of open targets per browser.
+    cdp_timeout :
+        Seconds to wait for a CDP answer.
+    interval :
+        Seconds between watchdog checks.
+    drain_timeout :
+        Seconds to wait for in-flight jobs before the browser restart.
+    profiles :
+        Directory for persistent browser profiles (``userDataDir``)
+        so HTTP, code and font caches stay warm across renders and
+        restarts. Every browser has its own subdirectory that is locked
+        while the browser lives (other pyppdf processes get an error
+        instead of sharing it). By default every launch gets a
+        throwaway profile. Incognito pages (the default) have their own
+        in-memory caches: pass ``incognito=False`` to use the profile
+        caches (see ``page_pool_kwargs``).
+    cache_size :
+        Max size of profile caches in bytes (HTTP cache gets half of
+        it via ``--disk-cache-size``). The watchdog restarts a browser
+        with bigger caches and cleans them before the launch.
+    warmup :
+        Scripts (URLs or file paths) that are loaded after every launch
+        so V8 code cache of the default browser context is warm (see
+        ``pyppdf.pool.warmup``). Used by pages with ``incognito=False``.
+    warmup_origin :
+        Origin of the documents (like ``'https://example.com'`` or
+        ``'file://'``) to load ``warmup`` scripts from.
+    page_pool_kwargs :
+        Passed to ``PagePool``. ``incognito=False`` is an opt-in for
+        warm shared caches (``profiles``, ``warmup``): jobs then share
+        the default browser context (only cookies and storage of the
+        visited origins are cleared after a job, other state like
+        HTTP cache is shared by tenants and persisted in profiles).
+    """
+    def __init__(self, args: Union[str, dict, RenderOptions]=None, size: int=None,
+                 pages: int=None, max_rss: int=2 * 2**30, max_targets: int=64,
+                 cdp_timeout: float=10, interval: float=5,
+                 drain_timeout: float=60, profiles: str=None,
+                 cache_size: int=512 * 2**20, warmup: List[str]=None,
+                 warmup_origin: str=None, **page_pool_kwargs):
+        self.options = render_options(args)
+        if (size is None) or (pages is None):
+            size_, pages_ = default_sizes(pages or 4)
+            size, pages = size or size_, pages or pages_
+        self.size = size
+        self.pages = pages
+        self.max_rss = max_rss
+        self.max_targets = max_targets
+        self.cdp_timeout = cdp_timeout
+        self.interval = interval
+        self.drain_timeout = drain_timeout
+        self.profiles = p.abspath(p.expanduser(profiles)) if profiles else None
+        self.cache_size = cache_size
+        self.warmup = list(warmup or [])
+        self.warmup_origin = warmup_origin
+        self.page_pool_kwargs = page_pool_kwargs
+        self._workers: List[_Worker] = []
+        self._ready = asyncio.Event()
+        self._watchdog = None
+        self._restarts = set()
+
+    def _profile(self, slot: int) -> str:
+        return p.join(self.profiles, f'browser-{slot}')
+
+    def _clean_profile(self, slot: int) -> Union[int, None]:
+        """
+        Locks the profile, removes stale Chromium locks (unless their
+        owner process on this host is alive) and too big caches of
+        the not running browser. Returns lock file descriptor.
+        """
+        profile = self._profile(slot)
+        os.makedirs(profile, exist_ok=True)
+        lock = _lock_profile(profile)
+        try:
+            owner = _singleton_owner(profile)
+            if owner is not None:
+                raise PyppdfError(
+                    f'Browser profile is used by a running Chromium (pid {owner}): {profile}')
+            for file in LOCK_FILES:
+                try:
+                    os.unlink(p.join(profile, file))
+                except OSError:
+                    pass
+            if _cache_size(profile) > self.cache_size:
+                for dir_ in CACHE_DIRS:
+                    shutil.rmtree(p.join(profile, dir_), ignore_errors=True)
+        except BaseException:
+            _unlock_profile(lock)
+            raise
+        return lock
+
+    async def _launch(self, slot: int) -> _Worker:
+        _launch = self.options.get('launch', {})
+        kwargs = _launch.kwargs
+        lock = None
+        if self.profiles:
+            profile = self._profile(slot)
+            lock = await asyncio.get_event_loop().run_in_executor(None, self._clean_profile, slot)
+            kwargs.setdefault('userDataDir', profile)
+            kwargs['args'] = list(kwargs.get('args', [])) + [
+                f"--disk-cache-dir={p.join(profile, 'Cache')}",
+                f'--disk-cache-size={self.cache_size // 2}']
+        try:
+            browser = await launch(*_launch.args, **kwargs)
+        except BaseException:
+            _unlock_profile(lock)
+            raise
+        if self.warmup:
+            try:
+                await warmup(browser, self.warmup, origin=self.warmup_origin)
+            except Exception:
+                await browser.close()
+                _unlock_profile(lock)
+                raise
+        pages = PagePool(browser, size=self.pages, **self.page_pool_kwargs)
+        return _Worker(browser, pages, slot, lock)
+
+    async def start(self):
+        """Launches browsers and starts the watchdog."""
+        self._workers = list(await asyncio.gather(*(self._launch(i) for i in range(self.size))))
+        self._ready.set()
+        self._watchdog = asyncio.ensure_future(self._watch())
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def render(self, args: Union[dict, RenderOptions],
+                     **kwargs) -> Union[bytes, BinaryIO, None]:
+        """
+        Same as ``main`` but uses a page of the least busy healthy
+        browser. ``kwargs`` are passed to ``main``.
+        """
+        while True:
+            if not self._workers:
+                raise PyppdfError('BrowserPool has no browsers (not started or restarts failed).')
+            serving = [w for w in self._workers if w.serving]
+            if serving:
+                break
+            self._ready.clear()
+            await self._ready.wait()
+        worker = min(serving, key=lambda w: w.active)
+        worker.active += 1
+        try:
+            return await worker.pages.render(args, **kwargs)
+        finally:
+            worker.active -= 1
+
+    @staticmethod
+    def _procs(browser: Browser) -> list:
+        proc = browser.process
+        if proc is None:
+            return []
+        try:
+            parent = psutil.Process(proc.pid)
+            return [parent] + parent.children(recursive=True)
+        except psutil.NoSuchProcess:
+            return []
+
+    async def _healthy(self, worker: _Worker) -> bool:
+        browser = worker.browser
+        if len(browser.targets()) > self.max_targets:
+            return False
+        rss = 0
+        for proc in self._procs(browser):
+            try:
+                rss += proc.memory_info().rss
+            except psutil.NoSuchProcess:
+                pass
+        if rss > self.max_rss:
+            return False
+        try:
+            await asyncio.wait_for(browser.version(), self.cdp_timeout)
+        except Exception:
+            return False
+        if self.profiles:
+            size = await asyncio.get_event_loop().run_in_executor(
+                None, _cache_size, self._profile(worker.slot))
+            if size > self.cache_size:
+                return False
+        return True
+
+    async def _watch(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            for worker in [w for w in self._workers if w.serving]:
+                if not await self._healthy(worker):
+                    worker.serving = False
+                    task = asyncio.ensure_future(self._restart(worker))
+                    self._restarts.add(task)
+                    task.add_done_callback(self._restarts.discard)
+
+    async def _restart(self, worker: _Worker):
+        """Drains ``worker`` and replaces it with a freshly launched one."""
+        loop = asyncio.get_event_loop()
+        deadline = loop.time() + self.drain_timeout
+        while worker.active and (loop.time() < deadline):
+            await asyncio.sleep(0.1)
+        await self._dispose(worker)
+        try:
+            new = await self._launch(worker.slot)
+        except Exception:
+            traceback.print_exc(file=sys.stderr)
+            self._workers.remove(worker)
+            self._ready.set()
+            return
+        self._workers[self._workers.index(worker)] = new
+        self._ready.set()
+
+    async def _dispose(self, worker: _Worker):
+        procs = self._procs(worker.browser)
+        try:
+            await asyncio.wait_for(worker.browser.close(), self.cdp_timeout)
+        except Exception:
+            pass
+        # psutil.wait_procs blocks so other browsers keep serving meanwhile:
+        await asyncio.get_event_loop().run_in_executor(None, _reap, procs)
+        lock, worker.lock = worker.lock, None
+        _unlock_profile(lock)
+
+    async def close(self):
+        """Stops the watchdog and closes all browsers."""
+        if self._watchdog is not None:
+            self._watchdog.cancel()
+            self._watchdog = None
+        for task in list(self._restarts):
+            task.cancel()
+        workers, self._workers = self._workers, []
+        for worker in workers:
+            worker.serving = False
+            await self._dispose(worker)
@@ -6,12 +6,21 @@ import psutil
 import traceback
 import pathlib
 import asyncio
+import inspect
 import re
-from typing import Union
-from litereval import litereval, merge, get_args
+import shutil
+from copy import deepcopy
+from functools import lru_cache
+from types import MappingProxyType
+from typing import Union, BinaryIO, List, Awaitable
+from litereval import litereval, merge, get, get_args
 # noinspection PyUnresolvedReferences
 from .patch_pyppeteer import patch_pyppeteer
-from pyppeteer import launch
+from .intercept import Interceptor, FontCache, font_cache, DOC_URL
+from .launcher import launch, PROFILES
+from pyppeteer import connect
+from pyppeteer.browser import Browser
+from pyppeteer.page import Page
 from pyppeteer.errors import PageError
 
 
@@ -34,22 +43,180 @@ def docstr_defaults(func, i: int):
         re.DOTALL)[i])
 
 
-async def main(args: dict, url: str=None, html: str=None, output_file: str=None,
-               goto: str=None, dir_: str=None) -> bytes:
+# Root ``args_dict`` keys that are parsed to ``*args, **kwargs``
+# once per ``RenderOptions`` instance:
+SECTIONS = ('launch', 'goto', 'emulateMedia', 'waitForNavigation', 'waitFor', 'pdf', 'chunks',
+            'screenshot', 'connect')
+
+
+@lru_cache(maxsize=128)
+def _litereval(string: str):
+    """
+    Memoized ``litereval``. Returned objects are shared
+    so they should never be modified in place.
+    """
+    return litereval(string)
+
+
+def _as_dict(name: str, args: Union[str, dict], default: str=None) -> dict:
+    if args is None:
+        args = default
+    if isinstance(args, str):
+        args = _litereval(args)
+    if not isinstance(args, dict):
+        raise TypeError(f'Invalid pyppdf `{name}` arg (should be a dict): {args}')
+    return args
+
+
+def _get_args(name: str, args, default=None):
+    """
+    ``litereval.get_args`` that also takes positional-only values
+    like ``{emulateMedia='screen'}`` or ``{screenshot=('thumb.png',)}``
+    (litereval fails to convert them to dict).
     """
-    Returns bytes of pdf.
+    value = get(name, args, default)
+    if (value is None) or isinstance(value, dict):
+        return get_args(name, args, default)
+    return get_args(name, {name: {(): value}})
+
+
+class RenderOptions:
+    """
+    Immutable pyppdf options that are evaluated, merged and parsed
+    to ``*args, **kwargs`` once and can be reused by many
+    ``save_pdf``/``main`` calls.
+
+    Parameters
+    ----------
+    args_dict :
+        Same as in 'save_pdf' function. Can also be ``RenderOptions``.
+    args_upd :
+        Same as in 'save_pdf' function.
+    """
+    __slots__ = ('_args', '_parsed')
+
+    def __init__(self, args_dict: Union[str, dict, 'RenderOptions']=None,
+                 args_upd: Union[str, dict]=None):
+        if isinstance(args_dict, RenderOptions):
+            args_dict = args_dict._args
+        else:
+            args_dict = _as_dict('args_dict', args_dict, ARGS_DICT)
+        if args_upd is not None:
+            args = merge(_as_dict('args_upd', args_upd), args_dict, copy=True)
+        else:
+            args = deepcopy(args_dict)
+        object.__setattr__(self, '_args', args)
+        object.__setattr__(self, '_parsed', MappingProxyType(
+            {name: _get_args(name, args) for name in SECTIONS if name in args}))
+
+    def __setattr__(self, key, value):
+        raise AttributeError(f"'{type(self).__name__}' object is immutable")
+
+    def __repr__(self):
+        return f'{type(self).__name__}({self._args!r})'
+
+    @property
+    def args(self) -> dict:
+        """Copy of the merged ``args_dict``."""
+        return deepcopy(self._args)
+
+    def get(self, name: str, default=None) -> tuple:
+        """
+        Same as ``litereval.get_args(name, args_dict, default)``
+        (``Args`` named tuple) but uses pre-parsed values when possible.
+        Returned ``kwargs`` dict is a fresh shallow copy.
+        """
+        ret = self._parsed.get(name)
+        if ret is None:
+            ret = _get_args(name, self._args, default)
+        if ret.kwargs is None:
+            return ret
+        return ret._replace(kwargs=dict(ret.kwargs))
+
+
+@lru_cache(maxsize=128)
+def _cached_options(args_dict: str=None, args_upd: str=None) -> RenderOptions:
+    return RenderOptions(args_dict, args_upd)
+
+
+def render_options(args_dict: Union[str, dict, RenderOptions]=None,
+                   args_upd: Union[str, dict]=None) -> RenderOptions:
+    """
+    Returns ``RenderOptions``. String-form (and default) args are
+    memoized so that repeated calls with the same strings are cheap.
+    ``RenderOptions`` ``args_dict`` is returned as is if there is no
+    ``args_upd``.
+    """
+    if isinstance(args_dict, RenderOptions) and (args_upd is None):
+        return args_dict
+    if all(a is None or isinstance(a, str) for a in (args_dict, args_upd)):
+        return _cached_options(args_dict, args_upd)
+    return RenderOptions(args_dict, args_upd)
+
+
+def _remove(file: str):
+    if file:
+        try:
+            os.remove(file)
+        except FileNotFoundError:
+            pass
+
+
+def _read(html: Union[str, BinaryIO]) -> str:
+    if isinstance(html, str):
+        return html
+    return html.read().decode('utf-8')
+
+
+def _write(out: Union[BinaryIO, bytearray, int], data: bytes):
+    """Writes ``data`` to file-like object, bytearray or file descriptor."""
+    if isinstance(out, int):
+        view = memoryview(data)
+        while view:
+            view = view[os.write(out, view):]
+    elif isinstance(out, bytearray):
+        out.extend(data)
+    else:
+        out.write(data)
+
+
+def _reap(procs: list):
+    """Terminates (then kills) ``procs`` that are still alive."""
+    gone, still_alive = psutil.wait_procs(procs, timeout=1)
+    for p_ in still_alive:
+        p_.terminate()
+    gone, still_alive = psutil.wait_procs(procs, timeout=50)
+    for p_ in still_alive:
+        p_.kill()
+
+
+async def main(args: Union[dict, RenderOptions], url: str=None, html: Union[str, BinaryIO]=None,
+               output_file: str=None,
+               goto: str=None, dir_: str=None,
+               browser: Union[Browser, Awaitable[Browser]]=None, page: Page=None,
+               deadline: float=None, pages: str=None,
+               draft: bool=False, returns: str='bytes',
+               out: Union[BinaryIO, bytearray, int]=None,
+               fonts: Union[str, FontCache]=None,
+               variants: List[Union[str, dict]]=None) -> Union[bytes, BinaryIO, list, None]:
+    """
+    Returns bytes of pdf (see ``returns``).
 
     Parameters
     ----------
     args :
         Pyppeteer options that govern conversion.
-        dict with keys dedicated for pyppeteer functions used.
+        dict with keys dedicated for pyppeteer functions used
+        or ``RenderOptions`` (preferable for repeated calls).
         See save_pdf for more details.
     url :
         Site address or html document file path (url - that by the
         way can also be set in args - has priority over html).
     html :
-        html document file source
+        html document file source. Or binary file-like object
+        (like ``sys.stdin.buffer``) that is streamed chunk by chunk
+        to the temp file in 'temp' goto mode (read at once and
+        decoded as utf-8 in other modes).
     output_file :
         Path to save pdf
     goto :
@@ -60,130 +227,303 @@ async def main(args: dict, url: str=None, html: str=None, output_file: str=None,
         >>> # then 'setContent' mode. 'url' works only if url (PAGE) arg was
         >>> # provided or {goto={url=<...>}} was set in the merged args.
         >>> # 'setContent' (works without page.goto), 'temp' (temp file) and
-        >>> # 'data-text-html' work only with stdin input. 'setContent' and
-        >>> # 'data-text-html' presumably do not support some remote
-        >>> # content. I have bugs with the last one when:
-        >>> # page.goto(f'data:text/html,{html}')
+        >>> # 'data-text-html' work only with stdin input. 'setContent'
+        >>> # presumably does not support some remote content.
+        >>> # 'data-text-html' serves html from memory as a utf-8 network
+        >>> # response (via request interception) to page.goto of
+        >>> # http://pyppdf.invalid/index.html so relative links do not work.
         >>> #
     dir_ :
         Directory for goto temp mode.
+    browser :
+        Already running pyppeteer browser. If set then the page is
+        opened in a fresh incognito browser context (cookies and
+        storage are isolated from other jobs) that is disposed
+        after the job. ``launch`` args are ignored and the browser
+        is not closed. By default a new browser is launched (or
+        connected to if ``connect`` args section is set). Can also be
+        awaitable (like a launch task) that is awaited after the input
+        is read (in a thread) so the launch overlaps with reading.
+    page :
+        Already opened pyppeteer page (see ``PagePool``). It is
+        neither closed nor reset after the job. Has priority over
+        ``browser``.
+    deadline :
+        Hard limit in seconds for loading and printing the page.
+        When exceeded the job is cancelled, the page is force-closed
+        (own browser is closed too) and ``PyppdfError`` is raised.
+        Shared ``browser`` stays usable.
+    pages :
+        Page ranges to print like ``'1-3, 5'`` (overrides
+        ``pdf={pageRanges=...}``). Fast previews of large documents.
+    draft :
+        Draft mode for previews: ``page.goto`` waits only for the
+        ``load`` event instead of the configured ``waitUntil``
+        (``networkidle0`` by default waits for 500 ms of network idle).
+    returns :
+        One of ``'bytes'`` (default), ``'file'`` (pdf file opened for
+        binary reading, needs ``output_file`` or ``pdf={path=...}``)
+        or ``None`` (nothing). Non-default values let batch jobs
+        avoid keeping PDFs in memory.
+    out :
+        Writable binary file-like object, ``bytearray`` or file
+        descriptor to write pdf to (in addition to ``output_file``).
+    fonts :
+        Fonts directory or ``FontCache``. Fonts are read once per
+        directory and served from memory (via request interception)
+        instead of any font request with the same file name (HTTP cache
+        stays enabled and other requests are not intercepted).
+    variants :
+        Output variants printed from the same loaded page (navigation,
+        network and waits are paid once). Every variant is a dict (or
+        litereval str) with optional ``pdf`` and ``emulateMedia`` keys
+        like ``{pdf={format='Letter'}, emulateMedia='screen'}``.
+        Variant ``pdf`` is merged into the ``pdf`` args, ``emulateMedia``
+        replaces the one from args. The first variant without its own
+        ``path`` is written to ``output_file`` (or ``pdf={path=...}``),
+        others to that path with ``-<i>`` suffix (``doc-1.pdf``...).
+        Then a list (one item per variant) is returned.
+        Not compatible with ``out``.
     """
-    _launch = get_args('launch', args, {})
-    _goto = get_args('goto', args, {})
+    if returns not in RETURNS:
+        raise ValueError(f'Invalid pyppdf `returns` arg (should be one of {RETURNS}): {returns}')
+    if not isinstance(args, RenderOptions):
+        args = RenderOptions(args)
+    if isinstance(fonts, str):
+        fonts = font_cache(p.abspath(p.expanduser(fonts)))
+    _launch = args.get('launch', {})
+    _connect = args.get('connect')
+    _goto = args.get('goto', {})
     url = _goto.kwargs.pop('url', url)
+    if draft:
+        _goto.kwargs['waitUntil'] = 'load'
     # noinspection PyPep8Naming
-    emulateMedia = get_args('emulateMedia', args)
+    emulateMedia = args.get('emulateMedia')
     # noinspection PyPep8Naming
-    waitForNavigation = get_args('waitForNavigation', args)
+    waitForNavigation = args.get('waitForNavigation')
     # noinspection PyPep8Naming
-    waitFor = get_args('waitFor', args)
-    pdf = get_args('pdf', args, {})
+    waitFor = args.get('waitFor')
+    pdf = args.get('pdf', {})
+    chunks = args.get('chunks')
+    screenshot = args.get('screenshot')
     if output_file:
         output_file = p.abspath(p.expandvars(p.expanduser(output_file)))
         if dir_ is None:
             dir_ = p.dirname(output_file)
         pdf.kwargs.setdefault('path', output_file)
+    if pages:
+        pdf.kwargs['pageRanges'] = pages
+    if variants is None:
+        jobs = [(_get_args('emulateMedia', {}), pdf.kwargs)]
+    else:
+        if out is not None:
+            raise PyppdfError('out arg is not compatible with variants.')
+        jobs = []
+        path = pdf.kwargs.get('path')
+        for i, variant in enumerate(variants):
+            variant = _as_dict('variants', variant)
+            pdf_ = merge(_get_args('pdf', variant, {}).kwargs, dict(pdf.kwargs), copy=True)
+            if i and path and (pdf_.get('path') == path):  # inherited path is not overwritten
+                root, ext = p.splitext(path)
+                pdf_['path'] = f'{root}-{i}{ext}'
+            jobs.append((_get_args('emulateMedia', variant), pdf_))
+    if (returns == 'file') and not all(pdf_.get('path') for _, pdf_ in jobs):
+        raise PyppdfError("returns='file' needs output_file or pdf={path=...}")
+    if screenshot.args:  # {screenshot='thumb.png'} form
+        if (len(screenshot.args) > 1) or ('path' in screenshot.kwargs):
+            raise PyppdfError('screenshot takes only path as positional arg, others are kwargs: ' +
+                              "{screenshot={(): 'thumb.png', width=200}}")
+        screenshot.kwargs['path'] = screenshot.args[0]
+    if (screenshot.args is not None) and not screenshot.kwargs.get('path'):
+        if not jobs[0][1].get('path'):
+            raise PyppdfError("screenshot needs path, output_file or pdf={path=...}")
+        screenshot.kwargs['path'] = p.splitext(jobs[0][1]['path'])[0] + '.png'
 
     temp_file = ''
 
     def get_url():
-        nonlocal temp_file
+        nonlocal temp_file, html
         if url and (not goto or goto == 'url'):
             if p.isfile(url):
                 return pathlib.Path(url).as_uri()
             return url
         elif html and (not goto or goto == 'setContent'):
+            html = _read(html)
             return None
 
         elif html and (goto == 'temp') and dir_:
             _temp_file = p.join(dir_, '__temp__.html')
             _url = pathlib.Path(_temp_file).as_uri()
-            print(html, file=open(_temp_file, 'w', encoding='utf-8'))
+            if isinstance(html, str):
+                with open(_temp_file, 'w', encoding='utf-8') as f:
+                    print(html, file=f)
+            else:
+                with open(_temp_file, 'wb') as f:
+                    shutil.copyfileobj(html, f, CHUNK_SIZE)
             temp_file = _temp_file
             return _url
 
         elif html and (goto == 'data-text-html'):
-            return f'data:text/html,{html}'
+            if not isinstance(html, str):
+                html = html.read()
+            return DOC_URL
         else:
             raise PyppdfError(
                 'Incompatible goto mode, or neither url nor html args were set.\n' +
                 f'goto: {goto}, dir_: {dir_}, url[:20]: {url[:20] if url else url}, ' +
-                f'html[:20]: {html[:20] if html else html}'
+                f'html[:20]: {html[:20] if isinstance(html, str) else html}'
             )
 
-    url = get_url()
-    browser = await launch(*_launch.args, **_launch.kwargs)
-    page = await browser.newPage()
-    procs = psutil.Process().children(recursive=True)
-
-    try:
-        if url:
-            await page.goto(url, *_goto.args, **_goto.kwargs)
-        else:
-            await page.setContent(html)
-
-        if emulateMedia.args is not None:
-            await page.emulateMedia(*emulateMedia.args, **emulateMedia.kwargs)
-        if waitForNavigation.args is not None:
-            await page.waitForNavigation(*waitForNavigation.args, **waitForNavigation.kwargs)
-        if waitFor.args is not None:
-            await page.waitFor(*waitFor.args, **waitFor.kwargs)
-
-        procs = psutil.Process().children(recursive=True)
-        ret = await page.pdf(**pdf.kwargs)
+    if inspect.isawaitable(browser):
+        url = await asyncio.get_event_loop().run_in_executor(None, get_url)
+        browser = await browser
+    else:
+        url = get_url()
+    connected = None
+    if (page is None) and (browser is None) and (_connect.args is not None):
+        browser = connected = await connect(*_connect.args, **_connect.kwargs)
+    if page is not None:
+        own_browser = context = None
+        procs = []
+    elif browser is None:
+        own_browser = await launch(*_launch.args, **_launch.kwargs)
+        context = None
+        page = await own_browser.newPage()
         procs = psutil.Process().children(recursive=True)
-
-        if temp_file:
-            try:
-                os.remove(temp_file)
-            except FileNotFoundError:
-                pass
-        await page.close()
+    else:
+        own_browser = None
         try:
-            await browser.close()
+            context = await browser.createIncognitoBrowserContext()
+            page = await context.newPage()
         except Exception:
-            traceback.print_exc(file=sys.stderr)
-        gone, still_alive = psutil.wait_procs(procs, timeout=1)
-        for p_ in still_alive:
-            p_.terminate()
-        gone, still_alive = psutil.wait_procs(procs, timeout=50)
-        for p_ in still_alive:
-            p_.kill()
-
-        if not ret:
-            raise PyppdfError("Empty PDF bytes received")
-        return ret
-    except Exception as e:
-        if temp_file:
+            if connected is not None:
+                await connected.disconnect()
+            raise
+        procs = []
+
+    async def dispose(verbose: bool):
+        _remove(temp_file)
+        if own_browser is None and context is None:
+            return
+        if context is not None:
             try:
-                os.remove(temp_file)
-            except FileNotFoundError:
-                pass
+                await context.close()
+            except Exception:
+                if verbose:
+                    traceback.print_exc(file=sys.stderr)
+            if connected is not None:
+                await connected.disconnect()
+            return
         try:
             await page.close()
         except Exception:
             pass
         try:
-            await browser.close()
+            await own_browser.close()
         except Exception:
-            pass
-        gone, still_alive = psutil.wait_procs(procs, timeout=1)
-        for p_ in still_alive:
-            p_.terminate()
-        gone, still_alive = psutil.wait_procs(procs, timeout=50)
-        for p_ in still_alive:
-            p_.kill()
-
-        raise e
-
+            if verbose:
+                traceback.print_exc(file=sys.stderr)
+        _reap(procs)
+
+    async def render() -> List[bytes]:
+        nonlocal procs
+        interceptor = None
+        if (url == DOC_URL) or (fonts is not None):
+            interceptor = Interceptor(*([fonts.response] if fonts is not None else []))
+            if url == DOC_URL:
+                interceptor.serve(DOC_URL, html.encode('utf-8') if isinstance(html, str) else html,
+                                  'text/html; charset=utf-8')
+            await interceptor.attach(page)
+        try:
+            if url:
+                await page.goto(url, *_goto.args, **_goto.kwargs)
+            else:
+                await page.setContent(html)
+
+            if emulateMedia.args is not None:
+                await page.emulateMedia(*emulateMedia.args, **emulateMedia.kwargs)
+            if waitForNavigation.args is not None:
+                await page.waitForNavigation(*waitForNavigation.args, **waitForNavigation.kwargs)
+            if waitFor.args is not None:
+                await page.waitFor(*waitFor.args, **waitFor.kwargs)
+
+            if own_browser is not None:
+                procs = psutil.Process().children(recursive=True)
+            ret_, current = [], emulateMedia
+            for media, pdf_ in jobs:
+                if media.args is None:
+                    media = emulateMedia
+                if media is not current:  # None args reset emulation
+                    await page.emulateMedia(*(media.args or ()), **(media.kwargs or {}))
+                    current = media
+                if chunks.args is not None:
+                    from .chunks import print_chunks
+                    ret_.append(await print_chunks(page, pdf_, media, *chunks.args, fonts=fonts,
+                                                   **chunks.kwargs))
+                else:
+                    ret_.append(await page.pdf(**pdf_))
+            if screenshot.args is not None:  # after printing so it can't change PDFs
+                media = jobs[0][0] if jobs[0][0].args is not None else emulateMedia
+                if media is not current:
+                    await page.emulateMedia(*(media.args or ()), **(media.kwargs or {}))
+                from .thumbnail import thumbnail
+                await thumbnail(page, jobs[0][1], **screenshot.kwargs)
+            if own_browser is not None:
+                procs = psutil.Process().children(recursive=True)
+        except BaseException:
+            if interceptor is not None:
+                interceptor.remove_listener()
+            raise
+        if interceptor is not None:
+            await interceptor.detach()
+        return ret_
 
-def save_pdf(output_file: str=None, url: str=None, html: str=None,
-             args_dict: Union[str, dict]=None,
+    try:
+        if deadline is None:
+            ret = await render()
+        else:
+            task = asyncio.ensure_future(render())
+            try:
+                ret = await asyncio.wait_for(task, deadline)
+            except asyncio.TimeoutError:
+                if not task.cancelled():  # pyppeteer timeout inside the job
+                    raise
+                # wait_for already cancelled the job; the page can still spin
+                # in JS so it's closed (browser stays usable for other jobs):
+                try:
+                    await asyncio.wait_for(page.close(), 10)
+                except Exception:
+                    pass
+                raise PyppdfError(f'Job deadline of {deadline} s exceeded.')
+    except BaseException:
+        # also on cancellation (shielded so the context or browser is closed anyway):
+        await asyncio.shield(dispose(verbose=False))
+        raise
+
+    await dispose(verbose=True)
+    if not all(ret):
+        raise PyppdfError("Empty PDF bytes received")
+    if out is not None:
+        _write(out, ret[0])
+    if returns == 'file':
+        ret = [open(pdf_['path'], 'rb') for _, pdf_ in jobs]
+    elif returns is None:
+        return None
+    return ret if variants is not None else ret[0]
+
+
+def save_pdf(output_file: str=None, url: str=None, html: Union[str, BinaryIO]=None,
+             args_dict: Union[str, dict, RenderOptions]=None,
              args_upd: Union[str, dict]=None,
-             goto: str=None, dir_: str=None) -> bytes:
+             goto: str=None, dir_: str=None, deadline: float=None,
+             pages: str=None, draft: bool=False, returns: str='bytes',
+             out: Union[BinaryIO, bytearray, int]=None,
+             fonts: Union[str, FontCache]=None,
+             variants: List[Union[str, dict]]=None) -> Union[bytes, BinaryIO, list, None]:
     """
     Converts html document to pdf via pyppeteer
-    and writes to disk if asked. Also returns bytes of pdf.
+    and writes to disk if asked. Also returns bytes of pdf
+    (see ``returns``).
 
     ``args_dict`` affect the following methods that are used during
     conversion (only the last name should be used):
@@ -200,10 +540,44 @@ def save_pdf(output_file: str=None, url: str=None, html: str=None,
     >>> #               bottom='1in', left='1in'},}}
     >>> #
 
+    ``args_dict`` may also have ``chunks`` key: opt-in parallel
+    rendering of very long documents. The settled page is split at
+    top-level section boundaries, chunks are printed on parallel
+    pages and PDFs are concatenated with bookmarks (needs ``pypdf``).
+    Kwargs are ``selector`` (default ``'body > section, body > h1'``)
+    and ``jobs`` (default ``4``). See ``pyppdf.chunks.print_chunks``.
+
+    ``args_dict`` may also have ``screenshot`` key: image of the
+    already loaded page that is taken in the same job after printing
+    (like a first-page thumbnail for a document index; the viewport
+    resize for the screenshot can't change the PDFs). Kwargs are
+    ``path`` (default is the pdf path with ``.png`` extension, can
+    also be the only positional arg: ``{screenshot='thumb.png'}``),
+    ``width`` (image width in px), ``region`` (``'page'`` - first page, default,
+    ``'viewport'`` or ``'full'``), ``type`` (``'png'`` or ``'jpeg'``)
+    and ``quality``. See ``pyppdf.thumbnail.thumbnail``.
+
+    ``args_dict`` may also have ``connect`` key: ``pyppeteer.connect``
+    kwargs like ``{browserWSEndpoint='ws://127.0.0.1:9222/devtools/browser/<id>'}``
+    for an externally managed Chromium (like a sidecar). Then ``launch``
+    is skipped, the page is opened in a fresh incognito context that is
+    closed after the job and the browser is only disconnected.
+
+    ``launch`` section also takes ``pipe`` option: ``{launch={pipe=True}}``
+    launches Chromium with ``--remote-debugging-pipe`` and CDP goes over
+    pipes instead of the websocket (POSIX only, see ``pyppdf.launcher``).
+    And ``profile`` option: name or list of names of launch profiles
+    (vetted Chromium flags for PDF-only workloads) like
+    ``{launch={profile='fast-print'}}``. Profiles: ``'fast-print'``
+    and ``'container'`` (also adds ``--disable-dev-shm-usage`` if
+    /dev/shm is small). See ``pyppdf.launcher.PROFILES``.
+
     ``args_upd`` examples that won't overwrite other options:
 
     * ``"{launch={args=['--no-sandbox', '--disable-setuid-sandbox']}}``
     *  ``"{emulateMedia="screen", waitFor=1000}"``
+    *  ``"{chunks={selector='body > section', jobs=8}}"``
+    *  ``"{screenshot={width=200, path='thumb.jpg', quality=80}}"``
 
     Formats for **values** of the ``args_dict``:
     ``*args`` and ``**kwargs`` for functions:
@@ -225,12 +599,15 @@ def save_pdf(output_file: str=None, url: str=None, html: str=None,
     html :
         html document file source
         (url has priority over html).
+        Can also be binary file-like object (see 'main' function).
     args_dict :
         Options that govern conversion.
         dict with pyppeteer kwargs or Python code str that would
         be "litereval" evaluated to the dictionary.
         If None then default values are used.
         Supports extended dict syntax: {foo=100, bar='yes'}.
+        Can also be ``RenderOptions`` that were created once
+        via ``render_options`` (string args are memoized anyway).
     args_upd :
         dict with *additional* pyppeteer kwargs or Python code str
         that would be "litereval" evaluated to the dictionary.
@@ -239,31 +616,70 @@ def save_pdf(output_file: str=None, url: str=None, html: str=None,
         Same as in 'main' function.
     dir_ :
         Directory for goto temp mode.
+    deadline :
+        Same as in 'main' function.
+    pages :
+        Same as in 'main' function.
+    draft :
+        Same as in 'main' function.
+    returns :
+        Same as in 'main' function.
+    out :
+        Same as in 'main' function.
+    fonts :
+        Same as in 'main' function.
+    variants :
+        Same as in 'main' function.
     """
-    if args_dict is None:
-        args_dict = litereval(ARGS_DICT)
-    elif isinstance(args_dict, str):
-        args_dict = litereval(args_dict)
-    if not isinstance(args_dict, dict):
-        raise TypeError(f'Invalid pyppdf `args_dict` arg (should be a dict): {args_dict}')
-
-    if args_upd is not None:
-        args_upd = litereval(args_upd) if isinstance(args_upd, str) else args_upd
-        if not isinstance(args_upd, dict):
-            raise TypeError(f'Invalid pyppdf `args_upd` arg (should be a dict): {args_upd}')
-        args_dict = merge(args_upd, args_dict, copy=True)
-
     return asyncio.get_event_loop().run_until_complete(
-        main(args=args_dict, url=url, html=html,
-             output_file=output_file, goto=goto, dir_=dir_)
+        main(args=render_options(args_dict, args_upd), url=url, html=html,
+             output_file=output_file, goto=goto, dir_=dir_, deadline=deadline,
+             pages=pages, draft=draft, returns=returns, out=out, fonts=fonts,
+             variants=variants)
     )
     
 
+RETURNS = ('bytes', 'file', None)
+CHUNK_SIZE = 2**20
 ARGS_DICT = docstr_defaults(save_pdf, 0)
 GOTO = litereval(docstr_defaults(main, 0))
 GOTO_HELP = docstr_defaults(main, 1)
 
 
+async def _cli_main(args: RenderOptions, page: str=None, goto: str=None,
+                    **kwargs) -> Union[bytes, None]:
+    """
+    'main' for the CLI: the browser is launched in background while
+    stdin is read so Chromium cold start overlaps with the previous
+    pipeline stage (like pandoc).
+    """
+    task = None
+    if args.get('connect').args is None:
+        _launch = args.get('launch', {})
+        task = asyncio.ensure_future(launch(*_launch.args, **_launch.kwargs))
+    try:
+        if page:
+            url, html = page, None
+        elif goto in ('temp', 'data-text-html'):  # no str decoding
+            url, html = None, sys.stdin.buffer
+        else:
+            url, html = None, await asyncio.get_event_loop().run_in_executor(None, sys.stdin.read)
+        return await main(args, url=url, html=html, goto=goto, browser=task, **kwargs)
+    finally:
+        if task is not None:
+            try:
+                browser = await task
+            except Exception:
+                pass
+            else:
+                procs = psutil.Process().children(recursive=True)
+                try:
+                    await browser.close()
+                except Exception:
+                    traceback.print_exc(file=sys.stderr)
+                _reap(procs)
+
+
 @click.command(help=f"""Reads html document, converts it to pdf via
 pyppeteer and writes to disk (or writes base64 encoded pdf to stdout).
 
@@ -292,10 +708,39 @@ https://pyppeteer.github.io/pyppeteer/reference.html#pyppeteer.page.Page.pdf
               help="Directory for '--goto temp' mode. Has priority over dir of the --out")
 @click.option('-g', '--goto', type=click.Choice(list(GOTO)), default=None,
               help=GOTO_HELP.replace('\r', '').replace('\n', ' '))
-def cli(page, args_dict, args_upd, out, dir_, goto):
-    url, html = (page, None) if page else (None, sys.stdin.read())
-    ret = save_pdf(output_file=out, args_dict=args_dict, args_upd=args_upd,
-                   goto=goto, url=url, html=html, dir_=dir_)
+@click.option('--deadline', type=float, default=None,
+              help='Hard limit in seconds for loading and printing the page.')
+@click.option('-p', '--pages', type=str, default=None,
+              help="Page ranges to print like '1-3, 5' (fast previews).")
+@click.option('--draft', is_flag=True, default=False,
+              help="Draft mode for previews: page.goto waits only for the 'load' event.")
+@click.option('-f', '--fonts', type=str, default=None,
+              help='Fonts directory. Fonts are served from memory instead of ' +
+                   'any font request with the same file name.')
+@click.option('-c', '--connect', 'connect_', type=str, default=None,
+              help='Browser websocket endpoint of an already running Chromium ' +
+                   '(ws://...) to connect to instead of launching.')
+@click.option('-l', '--launch-profile', 'profile', type=click.Choice(list(PROFILES)),
+              multiple=True, help='Named set of Chromium flags for PDF-only workloads. ' +
+                                  'Can be repeated.')
+@click.option('-s', '--screenshot', type=str, default=None,
+              help='Also save first page image (png or jpg) to this path. ' +
+                   "Size/quality: --upd \"{screenshot={width=200, quality=80}}\".")
+def cli(page, args_dict, args_upd, out, dir_, goto, deadline, pages, draft, fonts, connect_,
+        profile, screenshot):
+    upd = {}
+    if connect_:
+        upd['connect'] = dict(browserWSEndpoint=connect_)
+    if profile:
+        upd['launch'] = dict(profile=list(profile))
+    if screenshot:
+        upd['screenshot'] = dict(path=screenshot)
+    args = render_options(args_dict, args_upd)
+    if upd:
+        args = render_options(args, upd)
+    ret = asyncio.get_event_loop().run_until_complete(_cli_main(
+        args, page, goto=goto, output_file=out, dir_=dir_, deadline=deadline,
+        pages=pages, draft=draft, returns=None if out else 'bytes', fonts=fonts))
     if not out:
         import base64
         sys.stdout.write('data:application/pdf;base64,' + 
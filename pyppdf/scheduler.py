@@ -0,0 +1,291 @@
+import asyncio
+import hashlib
+import statistics
+import time
+from collections import OrderedDict, deque
+from typing import Union, List, Dict, BinaryIO, Hashable, Tuple
+from .pyppeteer_pdf import RenderOptions, render_options
+from .limits import MemoryBudget, CpuLoad, memory_percent
+
+
+class AdaptiveCapacity:
+    """
+    AIMD (additive increase, multiplicative decrease) controller of
+    the ``Scheduler`` capacity. Every ``window`` finished jobs it
+    decides: capacity is multiplied by ``decrease`` if the failure rate,
+    memory or CPU load (of the cgroup) is too high or the median latency
+    grew above ``latency_factor`` times the best one (Chromium thrashes),
+    else it's increased by ``increase`` if all slots were busy. So it
+    converges on peak throughput of the host.
+
+    Parameters
+    ----------
+    min_ :
+        Min capacity.
+    max_ :
+        Max capacity.
+    window :
+        Number of finished jobs per decision.
+    latency_factor :
+        Max ratio of the median latency to the best median latency.
+        The best latency slowly follows the current one (``drift``
+        per window) so heavier documents later don't block growth.
+    max_failures :
+        Max failure rate.
+    max_memory :
+        Max used memory percent of the cgroup limit (or of the system).
+    max_cpu :
+        Max CPU load percent of the cgroup quota (or of the system).
+    increase :
+        Additive increase step.
+    decrease :
+        Multiplicative decrease factor.
+    drift :
+        Relative growth of the best latency per window.
+    """
+    def __init__(self, min_: int=1, max_: int=32, window: int=8,
+                 latency_factor: float=2.0, max_failures: float=0.1,
+                 max_memory: float=90, max_cpu: float=95,
+                 increase: int=1, decrease: float=0.5, drift: float=0.1):
+        self.min = min_
+        self.max = max_
+        self.window = window
+        self.latency_factor = latency_factor
+        self.max_failures = max_failures
+        self.max_memory = max_memory
+        self.max_cpu = max_cpu
+        self.increase = increase
+        self.decrease = decrease
+        self.drift = drift
+        self.best: Union[float, None] = None
+        self._latencies: List[float] = []
+        self._failures = 0
+        self._saturated = False
+        self._skip = 0
+        self._cpu = CpuLoad()
+
+    def overloaded(self) -> bool:
+        """Whether memory or CPU load of the cgroup (or system) is too high."""
+        return ((memory_percent() > self.max_memory) or
+                (self._cpu.percent() > self.max_cpu))
+
+    def update(self, capacity: int, latency: float, failed: bool, saturated: bool) -> int:
+        """
+        Registers finished job and returns new capacity.
+        ``saturated`` means that all slots were busy or jobs were queued.
+        """
+        if self._skip:  # jobs that were started before the decrease
+            self._skip -= 1
+            return capacity
+        self._latencies.append(latency)
+        self._failures += failed
+        self._saturated = self._saturated or saturated
+        if len(self._latencies) < self.window:
+            return capacity
+        median = statistics.median(self._latencies)
+        failures = self._failures / len(self._latencies)
+        saturated = self._saturated
+        self._latencies, self._failures, self._saturated = [], 0, False
+        best = self.best
+        self.best = median if best is None else min(median, best * (1 + self.drift))
+        if ((failures > self.max_failures) or self.overloaded() or
+                ((best is not None) and (median > self.latency_factor * best))):
+            self._skip = capacity
+            return max(self.min, int(capacity * self.decrease))
+        if saturated:
+            return min(self.max, capacity + self.increase)
+        return capacity
+
+
+class Scheduler:
+    """
+    Job scheduler around a pool (``BrowserPool`` or ``PagePool``) for
+    service and batch modes. Jobs of higher priority classes start
+    first. Inside a class tenants are served round-robin (fair queuing)
+    so one tenant's big export does not block other tenants. Slots
+    ``reserved`` for a class can't be taken by lower classes so
+    interactive jobs start at once even when a huge export is queued.
+    Concurrent identical jobs are coalesced (single-flight): they share
+    one render and all receive the same result. ``adaptive`` controller
+    adjusts the capacity to the host at runtime. With ``memory`` budget
+    jobs are started only when the projected Chromium RSS fits the
+    cgroup (or system) memory limit, else they stay queued.
+
+    Parameters
+    ----------
+    pool :
+        Object with ``async render(args, **kwargs)`` method.
+    capacity :
+        Max number of jobs that run at once.
+    priorities :
+        Priority class names from the highest to the lowest.
+    reserved :
+        Number of slots reserved per priority class (for it and
+        higher classes). By default a quarter of the ``capacity``
+        (at least one slot) is reserved for the highest class. Slots
+        reserved for the classes above the lowest one should leave
+        at least one slot of the ``capacity`` for the lower classes.
+    coalesce :
+        Whether to coalesce concurrent jobs of the same priority class
+        with identical merged args, input and ``main`` kwargs. Only jobs
+        that return bytes and write nowhere (no ``output_file``, ``out``
+        or ``pdf={path=...}``) with str html and no ``variants`` are
+        coalesced.
+    adaptive :
+        ``AdaptiveCapacity`` controller. Then ``capacity`` is the start
+        value (pool should have pages for ``adaptive.max`` jobs). Its
+        ``min`` is raised so that reserved slots never take the whole
+        capacity.
+    memory :
+        ``MemoryBudget`` for memory-aware admission of jobs.
+    """
+    def __init__(self, pool, capacity: int=8,
+                 priorities: List[str]=('interactive', 'bulk'),
+                 reserved: Dict[str, int]=None, coalesce: bool=True,
+                 adaptive: AdaptiveCapacity=None, memory: MemoryBudget=None):
+        self.pool = pool
+        self.capacity = capacity
+        self.adaptive = adaptive
+        self.memory = memory
+        self.priorities = tuple(priorities)
+        if reserved is None:
+            reserved = {self.priorities[0]: min(max(1, capacity // 4), capacity - 1)}
+        self.reserved = dict(reserved)
+        unknown = set(self.reserved) - set(self.priorities)
+        if unknown:
+            raise ValueError(
+                f'Invalid pyppdf `reserved` arg (keys should be of {self.priorities}): {unknown}')
+        if self._reserved_total() >= capacity:
+            raise ValueError(f'Invalid pyppdf `reserved` arg (should leave at least one of ' +
+                             f'{capacity} slots for the lower classes): {self.reserved}')
+        if adaptive is not None:
+            adaptive.min = max(adaptive.min, self._reserved_total() + 1)
+        self._queues: Dict[str, OrderedDict] = {name: OrderedDict() for name in self.priorities}
+        self._running: Dict[str, int] = {name: 0 for name in self.priorities}
+        self.coalesce = coalesce
+        self._inflight: Dict[tuple, asyncio.Future] = {}
+
+    def _reserved_total(self) -> int:
+        """Reserved slots that the lowest class can't take."""
+        return sum(self.reserved.get(name, 0) for name in self.priorities[:-1])
+
+    @property
+    def running(self) -> int:
+        return sum(self._running.values())
+
+    def pending(self, priority: str=None) -> int:
+        """Number of queued jobs (of the ``priority`` class)."""
+        names = [priority] if priority else self.priorities
+        return sum(len(jobs) for name in names for jobs in self._queues[name].values())
+
+    def _can_start(self, i: int) -> bool:
+        free = self.capacity - self.running
+        # reserved slots of higher classes that they don't use now:
+        held = sum(max(0, self.reserved.get(name, 0) - self._running[name])
+                   for name in self.priorities[:i])
+        held = min(held, self.capacity - 1)  # capacity may shrink below reserved slots
+        if free <= held:
+            return False
+        return (self.memory is None) or self.memory.fits(self.running)
+
+    def _dispatch(self):
+        for i, name in enumerate(self.priorities):
+            queue = self._queues[name]
+            while queue and self._can_start(i):
+                tenant, jobs = next(iter(queue.items()))
+                start = jobs.popleft()
+                if jobs:
+                    queue.move_to_end(tenant)
+                else:
+                    del queue[tenant]
+                if start.cancelled():
+                    continue
+                self._running[name] += 1
+                if self.memory is not None:
+                    self.memory.admit()
+                start.set_result(None)
+
+    @staticmethod
+    def _key(args: RenderOptions, priority: str, kwargs: dict) -> Union[tuple, None]:
+        """Single-flight key of the job or None if it can't be shared."""
+        kwargs = dict(kwargs)
+        html = kwargs.pop('html', None)
+        if (kwargs.get('output_file') or (kwargs.get('out') is not None) or
+                kwargs.get('variants') or (kwargs.get('returns', 'bytes') != 'bytes') or
+                not isinstance(html, (str, type(None))) or
+                args.get('pdf', {}).kwargs.get('path')):
+            return None
+        html = hashlib.sha256(html.encode('utf-8')).hexdigest() if html else None
+        return (priority, repr(args), html,
+                tuple(sorted((key, repr(val)) for key, val in kwargs.items())))
+
+    def _forget(self, key: tuple, task: asyncio.Future):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if not task.cancelled():
+            task.exception()  # retrieved even if all waiters were cancelled
+
+    def _done(self, priority: str, sample: Tuple[float, bool]=None):
+        """``sample`` is latency and failure flag of the finished job."""
+        if (self.adaptive is not None) and (sample is not None):
+            saturated = (self.running >= self.capacity) or (self.pending() > 0)
+            self.capacity = self.adaptive.update(self.capacity, *sample, saturated)
+        self._running[priority] -= 1
+        self._dispatch()
+
+    async def render(self, args: Union[dict, RenderOptions], priority: str=None,
+                     tenant: Hashable=None, **kwargs) -> Union[bytes, BinaryIO, None]:
+        """
+        Waits for a slot and renders via ``pool.render(args, **kwargs)``
+        (or joins identical in-flight job).
+
+        Parameters
+        ----------
+        args :
+            Same as in 'main' function.
+        priority :
+            Priority class name. Default is the lowest class.
+        tenant :
+            Tenant key for fair queuing inside the class.
+        kwargs :
+            Passed to ``pool.render``.
+        """
+        priority = priority or self.priorities[-1]
+        if priority not in self._queues:
+            raise ValueError(
+                f'Invalid pyppdf `priority` arg (should be one of {self.priorities}): {priority}')
+        args = render_options(args)
+        key = self._key(args, priority, kwargs) if self.coalesce else None
+        if key is None:
+            return await self._render(args, priority, tenant, kwargs)
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._render(args, priority, tenant, kwargs))
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._forget(key, t))
+        # one waiter's cancellation doesn't cancel the shared render:
+        return await asyncio.shield(task)
+
+    async def _render(self, args: RenderOptions, priority: str, tenant: Hashable,
+                      kwargs: dict) -> Union[bytes, BinaryIO, None]:
+        start = asyncio.get_event_loop().create_future()
+        self._queues[priority].setdefault(tenant, deque()).append(start)
+        self._dispatch()
+        try:
+            await start
+        except asyncio.CancelledError:
+            if start.done() and not start.cancelled():  # got the slot anyway
+                self._done(priority)
+            raise
+        t, sample = time.perf_counter(), None
+        try:
+            ret = await self.pool.render(args, **kwargs)
+            sample = (time.perf_counter() - t, False)
+            return ret
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            sample = (time.perf_counter() - t, True)
+            raise
+        finally:
+            self._done(priority, sample)
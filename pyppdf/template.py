@@ -0,0 +1,243 @@
+import asyncio
+import os.path as p
+import pathlib
+import sys
+import traceback
+from typing import Union, List, Dict, BinaryIO
+from pyppeteer.browser import Browser, BrowserContext
+from pyppeteer.page import Page
+from .intercept import Interceptor, FontCache, font_cache
+from .pyppeteer_pdf import RenderOptions, render_options, PyppdfError, RETURNS, _write
+from .chunks import READY_JS
+
+# language=JavaScript
+INJECT_JS = '''(func, data) => {
+    if (typeof window[func] !== 'function') {
+        throw new Error(`Template has no window.${func}(data) function`);
+    }
+    return window[func](data);
+}'''
+
+
+class Template:
+    """
+    Template mode for many documents that share one html/css/js
+    layout and differ only in data (invoices, reports). The template
+    is loaded and settled once per page. Every job injects JSON data
+    via ``window[func](data)`` registered by the template (returned
+    promise is awaited), waits for the ``ready`` function and prints
+    the page. There is no navigation or asset reload per document.
+
+    Parameters
+    ----------
+    browser :
+        Running pyppeteer browser.
+    args :
+        Same as in 'main' function. ``goto``, ``emulateMedia``,
+        ``waitForNavigation`` and ``waitFor`` are used once per page
+        load, ``pdf`` - per job.
+    url :
+        Template URL or html file path (has priority over html).
+    html :
+        Template html source.
+    size :
+        Number of template pages that render jobs in parallel.
+    func :
+        Name of the template JS function that takes data.
+    ready :
+        JS function for ``page.waitForFunction`` after the data
+        injection. By default waits for images and fonts.
+    fonts :
+        Same as in 'main' function.
+    incognito :
+        Whether every page lives in its own incognito browser context.
+    """
+    def __init__(self, browser: Browser, args: Union[str, dict, RenderOptions]=None,
+                 url: str=None, html: str=None, size: int=1, func: str='render',
+                 ready: str=READY_JS, fonts: Union[str, FontCache]=None,
+                 incognito: bool=True):
+        if not (url or html):
+            raise PyppdfError('Template needs url or html.')
+        self.browser = browser
+        self.args = render_options(args)
+        self.url = pathlib.Path(url).as_uri() if url and p.isfile(url) else url
+        self.html = html
+        self.size = size
+        self.func = func
+        self.ready = ready
+        self.fonts = (font_cache(p.abspath(p.expanduser(fonts))) if isinstance(fonts, str)
+                      else fonts)
+        self.incognito = incognito
+        self._idle: Union[asyncio.Queue, None] = None
+        self._pages: List[Page] = []
+        self._contexts: Dict[Page, BrowserContext] = {}
+        self._replacing = 0
+
+    async def _open(self) -> Page:
+        if self.incognito:
+            context = await self.browser.createIncognitoBrowserContext()
+            page = await context.newPage()
+            self._contexts[page] = context
+        else:
+            page = await self.browser.newPage()
+        self._pages.append(page)
+        try:
+            if self.fonts is not None:
+                await Interceptor(self.fonts.response).attach(page)
+            await self._load(page)
+        except Exception:
+            await self._close(page)
+            raise
+        return page
+
+    async def _load(self, page: Page):
+        _goto = self.args.get('goto', {})
+        _goto.kwargs.pop('url', None)
+        if self.url:
+            await page.goto(self.url, *_goto.args, **_goto.kwargs)
+        else:
+            await page.setContent(self.html)
+        for name in ('emulateMedia', 'waitForNavigation', 'waitFor'):
+            method = self.args.get(name)
+            if method.args is not None:
+                await getattr(page, name)(*method.args, **method.kwargs)
+
+    async def _close(self, page: Page):
+        if page not in self._pages:
+            return
+        self._pages.remove(page)
+        context = self._contexts.pop(page, None)
+        try:
+            if context is not None:
+                await context.close()
+            else:
+                await page.close()
+        except Exception:
+            pass
+
+    async def start(self):
+        """Loads template pages."""
+        if self._idle is None:
+            try:
+                pages = await asyncio.gather(*(self._open() for _ in range(self.size)))
+            except Exception:
+                await self.close()
+                raise
+            self._idle = asyncio.Queue()
+            for page in pages:
+                self._idle.put_nowait(page)
+
+    async def __aenter__(self) -> 'Template':
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def render(self, data, output_file: str=None, pages: str=None,
+                     deadline: float=None, returns: str='bytes',
+                     out: Union[BinaryIO, bytearray, int]=None) -> Union[bytes, BinaryIO, None]:
+        """
+        Renders the template with JSON serializable ``data`` on a free
+        template page. The page is reloaded if the job fails. Waiting
+        jobs get ``PyppdfError`` when no pages are left (reloads failed)
+        or the template is closed.
+
+        Parameters
+        ----------
+        data :
+            Argument of the template JS function.
+        output_file :
+            Path to save pdf.
+        pages :
+            Same as in 'main' function.
+        deadline :
+            Hard limit in seconds for the data injection and printing.
+        returns :
+            Same as in 'main' function.
+        out :
+            Same as in 'main' function.
+        """
+        if returns not in RETURNS:
+            raise ValueError(
+                f'Invalid pyppdf `returns` arg (should be one of {RETURNS}): {returns}')
+        pdf = self.args.get('pdf', {})
+        if output_file:
+            pdf.kwargs['path'] = p.abspath(p.expandvars(p.expanduser(output_file)))
+        if pages:
+            pdf.kwargs['pageRanges'] = pages
+        if (returns == 'file') and not pdf.kwargs.get('path'):
+            raise PyppdfError("returns='file' needs output_file or pdf={path=...}")
+        await self.start()
+        if not (self._pages or self._replacing):
+            raise PyppdfError('Template pages failed to reload.')
+        idle = self._idle
+        page = await idle.get()
+        if page is None:  # no pages are left: wake the next waiter too
+            idle.put_nowait(None)
+            raise PyppdfError('Template pages failed to reload.' if self._idle is idle
+                              else 'Template is closed.')
+
+        async def render() -> bytes:
+            await page.evaluate(INJECT_JS, self.func, data)
+            if self.ready:
+                await page.waitForFunction(self.ready)
+            return await page.pdf(**pdf.kwargs)
+
+        try:
+            if deadline is None:
+                ret = await render()
+            else:
+                task = asyncio.ensure_future(render())
+                try:
+                    ret = await asyncio.wait_for(task, deadline)
+                except asyncio.TimeoutError:
+                    if not task.cancelled():  # pyppeteer timeout inside the job
+                        raise
+                    raise PyppdfError(f'Job deadline of {deadline} s exceeded.')
+        except BaseException:
+            # template state is unknown now:
+            asyncio.ensure_future(self._replace(page))
+            raise
+        if self._idle is not None:  # else closed meanwhile
+            self._idle.put_nowait(page)
+
+        if not ret:
+            raise PyppdfError("Empty PDF bytes received")
+        if out is not None:
+            _write(out, ret)
+        if returns == 'file':
+            return open(pdf.kwargs['path'], 'rb')
+        if returns is None:
+            return None
+        return ret
+
+    async def _replace(self, page: Page, attempts: int=3):
+        self._replacing += 1
+        try:
+            await self._close(page)
+            for i in range(attempts):
+                try:
+                    new = await self._open()
+                    break
+                except Exception:
+                    if (self._idle is None) or (i == attempts - 1):
+                        traceback.print_exc(file=sys.stderr)
+                        return
+                    await asyncio.sleep(1)
+            if self._idle is None:  # closed meanwhile
+                await self._close(new)
+            else:
+                self._idle.put_nowait(new)
+        finally:
+            self._replacing -= 1
+            if (self._idle is not None) and not (self._pages or self._replacing):
+                self._idle.put_nowait(None)  # wakes waiters with an error
+
+    async def close(self):
+        """Closes template pages (the browser is not closed)."""
+        idle, self._idle = self._idle, None
+        if idle is not None:
+            idle.put_nowait(None)  # wakes waiters with an error
+        for page in list(self._pages):
+            await self._close(page)
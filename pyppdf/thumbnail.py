@@ -0,0 +1,95 @@
+"""
+Screenshots (like first-page thumbnails) of the already loaded page
+that are taken in the same job as the PDF.
+"""
+import base64
+from pyppeteer.page import Page, convertPrintParameterToInches
+from .pyppeteer_pdf import PyppdfError
+
+REGIONS = ('page', 'viewport', 'full')
+TYPES = ('png', 'jpeg')
+
+
+def paper_ratio(pdf: dict) -> float:
+    """Paper height to width ratio of ``page.pdf`` kwargs."""
+    if pdf.get('format'):
+        fmt = Page.PaperFormats.get(pdf['format'].lower())
+        if fmt is None:
+            raise PyppdfError(f"Unknown paper format: {pdf['format']}")
+        width, height = fmt['width'], fmt['height']
+    else:
+        width = convertPrintParameterToInches(pdf.get('width')) or 8.5
+        height = convertPrintParameterToInches(pdf.get('height')) or 11.0
+    if pdf.get('landscape'):
+        width, height = height, width
+    return height / width
+
+
+async def thumbnail(page: Page, pdf: dict, path: str, width: int=None,
+                    region: str='page', type: str=None, quality: int=None) -> bytes:
+    """
+    Takes a screenshot of the loaded ``page``, writes it to ``path``
+    and returns image bytes. Chromium scales the image itself so small
+    thumbnails are cheap.
+
+    Parameters
+    ----------
+    page :
+        Loaded page.
+    pdf :
+        ``page.pdf`` kwargs (paper size for ``'page'`` region).
+    path :
+        Image path.
+    width :
+        Image width in px (height is scaled proportionally).
+        Default is the page width.
+    region :
+        One of ``'page'`` (top of the page with the paper aspect
+        ratio - first page preview), ``'viewport'`` or ``'full'``
+        (whole page).
+    type :
+        ``'png'`` or ``'jpeg'``. Default is guessed from ``path``.
+    quality :
+        jpeg quality 0-100.
+    """
+    if region not in REGIONS:
+        raise ValueError(
+            f'Invalid pyppdf screenshot `region` arg (should be one of {REGIONS}): {region}')
+    if type is None:
+        type = 'jpeg' if path.lower().endswith(('.jpg', '.jpeg')) else 'png'
+    if type not in TYPES:
+        raise ValueError(
+            f'Invalid pyppdf screenshot `type` arg (should be one of {TYPES}): {type}')
+    size = await page.evaluate('''() => ({
+        width: document.documentElement.clientWidth,
+        height: Math.max(document.documentElement.scrollHeight,
+                         document.body ? document.body.scrollHeight : 0),
+        viewport: window.innerHeight})''')
+    clip_width = size['width']
+    if region == 'page':
+        height = round(clip_width * paper_ratio(pdf))
+    elif region == 'viewport':
+        height = size['viewport']
+    else:
+        height = size['height']
+    scale = width / clip_width if width else 1
+    options = dict(format=type, clip=dict(x=0, y=0, width=clip_width, height=height, scale=scale))
+    if quality is not None and type == 'jpeg':
+        options['quality'] = quality
+    client = page._client
+    beyond = height > size['viewport']
+    if beyond:  # the same as pyppeteer does for fullPage
+        await client.send('Emulation.setDeviceMetricsOverride', dict(
+            mobile=False, width=clip_width, height=height, deviceScaleFactor=1))
+    try:
+        # pyppeteer's page.screenshot forces scale=1 of the clip:
+        ret = base64.b64decode((await client.send('Page.captureScreenshot', options))['data'])
+    finally:
+        if beyond:
+            if page.viewport:
+                await page.setViewport(page.viewport)
+            else:
+                await client.send('Emulation.clearDeviceMetricsOverride')
+    with open(path, 'wb') as f:
+        f.write(ret)
+    return ret
@@ -39,11 +39,13 @@ setup(
     packages=find_packages(exclude=['docs', 'tests']),
     python_requires='>=3.6',
     install_requires=['certifi', 'click', 'psutil', 'litereval>=0.0.9', 'pyppeteer>=0.2.2'],
+    extras_require={'chunks': ['pypdf>=3.0']},
 
     entry_points={
         'console_scripts': [
             'pyppdf=pyppdf.pyppeteer_pdf:cli',
             'pyppdf-install=pyppdf.install:install',
+            'pyppdf-build=pyppdf.build:cli',
         ],
     },
 )
@@ -0,0 +1,121 @@
+from collections import namedtuple
+import pytest
+from pyppdf import limits, MemoryBudget
+
+GiB = 2**30
+VirtualMemory = namedtuple('VirtualMemory', 'total available')
+
+
+@pytest.fixture
+def cgroup(tmp_path, monkeypatch):
+    """Writes cgroup tree files: ``cgroup(proc, {path: content})``."""
+    monkeypatch.setattr(limits, 'CGROUP', str(tmp_path / 'cgroup'))
+    monkeypatch.setattr(limits, 'PROC_CGROUP', str(tmp_path / 'proc-self-cgroup'))
+    monkeypatch.setattr(limits.psutil, 'virtual_memory', lambda: VirtualMemory(64 * GiB, 60 * GiB))
+    monkeypatch.setattr(limits.os, 'sched_getaffinity', lambda pid: set(range(8)), raising=False)
+
+    def write(proc: str, files: dict):
+        (tmp_path / 'proc-self-cgroup').write_text(proc)
+        for path, content in files.items():
+            file = tmp_path / 'cgroup' / path
+            file.parent.mkdir(parents=True, exist_ok=True)
+            file.write_text(content)
+    return write
+
+
+def test_v2(cgroup):
+    cgroup('0::/kubepods/pod1\n', {
+        'kubepods/pod1/memory.max': f'{2 * GiB}\n',
+        'kubepods/pod1/memory.current': f'{GiB}\n',
+        'kubepods/pod1/memory.stat': f'anon {GiB // 2}\ninactive_file {GiB // 4}\n',
+        'kubepods/pod1/cpu.max': '150000 100000\n',
+        'kubepods/pod1/cpu.stat': 'usage_usec 2500000\nuser_usec 2000000\n',
+    })
+    assert limits.memory_limit() == 2 * GiB
+    assert limits.memory_usage() == GiB - GiB // 4
+    assert limits.memory_percent() == 37.5
+    assert limits.cpu_limit() == 1.5
+    assert limits.cpu_usage() == 2.5
+
+
+def test_v2_no_limits(cgroup):
+    cgroup('0::/user.slice\n', {
+        'user.slice/memory.max': 'max\n',
+        'user.slice/memory.current': f'{GiB}\n',
+        'user.slice/cpu.max': 'max 100000\n',
+    })
+    assert limits.memory_limit() == 64 * GiB
+    assert limits.memory_usage() == 4 * GiB  # system usage
+    assert limits.cpu_limit() == 8
+
+
+def test_v1(cgroup):
+    cgroup('5:memory:/docker/abc\n4:cpu,cpuacct:/docker/abc\n', {
+        'memory/docker/abc/memory.limit_in_bytes': f'{GiB}\n',
+        'memory/docker/abc/memory.usage_in_bytes': f'{GiB // 2}\n',
+        'memory/docker/abc/memory.stat': f'cache 100\ntotal_inactive_file {GiB // 8}\n',
+        'cpu,cpuacct/docker/abc/cpu.cfs_quota_us': '200000\n',
+        'cpu,cpuacct/docker/abc/cpu.cfs_period_us': '100000\n',
+        'cpu,cpuacct/docker/abc/cpuacct.usage': '3000000000\n',
+    })
+    assert limits.memory_limit() == GiB
+    assert limits.memory_usage() == GiB // 2 - GiB // 8
+    assert limits.cpu_limit() == 2
+    assert limits.cpu_usage() == 3
+
+
+def test_v1_no_limits(cgroup):
+    cgroup('5:memory:/\n4:cpu,cpuacct:/\n', {
+        'memory/memory.limit_in_bytes': '9223372036854771712\n',
+        'cpu,cpuacct/cpu.cfs_quota_us': '-1\n',
+        'cpu,cpuacct/cpu.cfs_period_us': '100000\n',
+    })
+    assert limits.memory_limit() == 64 * GiB
+    assert limits.cpu_limit() == 8
+
+
+def test_hybrid(cgroup):
+    # v2 hierarchy without controllers (mounted at unified/), controllers are v1:
+    cgroup('0::/user.slice\n5:memory:/user.slice\n4:cpu,cpuacct:/user.slice\n', {
+        'unified/user.slice/cgroup.procs': '1\n',
+        'memory/user.slice/memory.limit_in_bytes': f'{4 * GiB}\n',
+        'memory/user.slice/memory.usage_in_bytes': f'{GiB}\n',
+        'cpu,cpuacct/user.slice/cpu.cfs_quota_us': '400000\n',
+        'cpu,cpuacct/user.slice/cpu.cfs_period_us': '100000\n',
+    })
+    assert limits.memory_limit() == 4 * GiB
+    assert limits.memory_usage() == GiB
+    assert limits.cpu_limit() == 4
+
+
+def test_default_sizes(cgroup):
+    cgroup('0::/pod\n', {'pod/memory.max': f'{GiB}\n', 'pod/cpu.max': '200000 100000\n'})
+    # two pages per CPU fit 80% of 1 GiB (~137.5 MiB per page with the browser share):
+    assert limits.default_sizes() == (1, 4)
+    cgroup('0::/pod\n', {'pod/memory.max': f'{64 * 2**20}\n', 'pod/cpu.max': '200000 100000\n'})
+    assert limits.default_sizes() == (1, 1)
+    cgroup('0::/pod\n', {'pod/memory.max': 'max\n', 'pod/cpu.max': 'max 100000\n'})
+    assert limits.default_sizes() == (4, 4)
+
+
+def test_memory_budget(monkeypatch):
+    monkeypatch.setattr(limits, 'memory_usage', lambda: 700)
+    budget = MemoryBudget(limit=1000, page_rss=100, reserve=0.1, ramp=60)
+    assert budget.fits(0) and budget.fits(1)
+    budget.admit()
+    assert budget.fits(1)  # 700 + 2 * 100 <= 900
+    budget.admit()
+    assert not budget.fits(2)
+    assert budget.fits(0)  # nothing runs
+    budget.ramp = 0  # admitted jobs are not projected any more
+    assert budget.fits(2)
+
+
+def test_cpu_load_of_cgroup_quota(monkeypatch):
+    monkeypatch.setattr(limits.psutil, 'cpu_percent', lambda interval: 10.0)
+    monkeypatch.setattr(limits, 'cpu_limit', lambda: 2.0)
+    usage, now = iter([100.0, 101.8]), iter([50.0, 51.0])
+    monkeypatch.setattr(limits, 'cpu_usage', lambda: next(usage))
+    monkeypatch.setattr(limits.time, 'monotonic', lambda: next(now))
+    # 1.8 CPU seconds per second of the 2 CPU quota on a mostly idle host:
+    assert limits.CpuLoad().percent() == pytest.approx(90)
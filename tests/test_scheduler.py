@@ -0,0 +1,190 @@
+import asyncio
+import pytest
+from pyppdf import Scheduler, AdaptiveCapacity
+
+
+class FakePool:
+    """Pool which jobs finish only when the test releases them."""
+    def __init__(self):
+        self.started = []
+        self.gates = {}
+
+    async def render(self, args, html=None, **kwargs):
+        self.started.append(html)
+        gate = asyncio.get_event_loop().create_future()
+        self.gates.setdefault(html, []).append(gate)
+        await gate
+        return html if isinstance(html, bytes) else html.encode('utf-8')
+
+    def release(self, html):
+        for gate in self.gates.pop(html):
+            gate.set_result(None)
+
+
+async def _settle():
+    for _ in range(10):
+        await asyncio.sleep(0)
+
+
+def test_priority_order():
+    async def run():
+        pool = FakePool()
+        scheduler = Scheduler(pool, capacity=1, coalesce=False)
+        first = asyncio.ensure_future(scheduler.render({}, html='first'))
+        await _settle()
+        bulk = asyncio.ensure_future(scheduler.render({}, priority='bulk', html='bulk'))
+        await _settle()
+        interactive = asyncio.ensure_future(
+            scheduler.render({}, priority='interactive', html='interactive'))
+        await _settle()
+        assert pool.started == ['first']
+        pool.release('first')
+        await _settle()
+        assert pool.started == ['first', 'interactive']
+        pool.release('interactive')
+        await _settle()
+        pool.release('bulk')
+        results = await asyncio.gather(first, bulk, interactive)
+        assert results == [b'first', b'bulk', b'interactive']
+        assert pool.started == ['first', 'interactive', 'bulk']
+    asyncio.run(run())
+
+
+def test_reserved_slots():
+    async def run():
+        pool = FakePool()
+        scheduler = Scheduler(pool, capacity=3, reserved={'interactive': 1}, coalesce=False)
+        bulk = [asyncio.ensure_future(scheduler.render({}, html=f'bulk{i}')) for i in range(4)]
+        await _settle()
+        assert pool.started == ['bulk0', 'bulk1']
+        interactive = asyncio.ensure_future(
+            scheduler.render({}, priority='interactive', html='interactive'))
+        await _settle()
+        assert pool.started == ['bulk0', 'bulk1', 'interactive']
+        for html in ('interactive', 'bulk0', 'bulk1'):
+            pool.release(html)
+        await _settle()
+        assert pool.started[3:] == ['bulk2', 'bulk3']
+        pool.release('bulk2')
+        pool.release('bulk3')
+        await asyncio.gather(interactive, *bulk)
+        assert scheduler.running == 0
+    asyncio.run(run())
+
+
+def test_tenant_round_robin():
+    async def run():
+        pool = FakePool()
+        scheduler = Scheduler(pool, capacity=1, coalesce=False)
+        first = asyncio.ensure_future(scheduler.render({}, html='first'))
+        await _settle()
+        jobs = [asyncio.ensure_future(scheduler.render({}, tenant=tenant, html=f'{tenant}{i}'))
+                for tenant, n in (('a', 3), ('b', 2)) for i in range(n)]
+        await _settle()
+        pool.release('first')
+        for _ in jobs:
+            await _settle()
+            pool.release(pool.started[-1])
+        await asyncio.gather(first, *jobs)
+        assert pool.started == ['first', 'a0', 'b0', 'a1', 'b1', 'a2']
+    asyncio.run(run())
+
+
+def test_default_reserved_leaves_a_slot():
+    async def run():
+        pool = FakePool()
+        scheduler = Scheduler(pool, capacity=1)
+        job = asyncio.ensure_future(scheduler.render({}, html='bulk'))
+        await _settle()
+        pool.release('bulk')
+        assert await asyncio.wait_for(job, 1) == b'bulk'
+    asyncio.run(run())
+
+
+def test_invalid_reserved():
+    with pytest.raises(ValueError):
+        Scheduler(FakePool(), capacity=2, reserved={'interactive': 2})
+    with pytest.raises(ValueError):
+        Scheduler(FakePool(), capacity=4, reserved={'urgent': 1})
+
+
+def test_adaptive_decrease_does_not_starve_lower_classes():
+    class FailingPool:
+        async def render(self, args, **kwargs):
+            await asyncio.sleep(0)
+            raise RuntimeError('render failed')
+
+    async def run():
+        adaptive = AdaptiveCapacity(window=2)
+        scheduler = Scheduler(FailingPool(), capacity=4, adaptive=adaptive, coalesce=False)
+        assert adaptive.min == 2
+        jobs = [scheduler.render({}, html=f'bulk{i}') for i in range(40)]
+        results = await asyncio.wait_for(asyncio.gather(*jobs, return_exceptions=True), 5)
+        assert all(isinstance(r, RuntimeError) for r in results)
+        assert scheduler.capacity >= adaptive.min
+    asyncio.run(run())
+
+
+def test_coalesce_identical_jobs():
+    async def run():
+        pool = FakePool()
+        scheduler = Scheduler(pool, capacity=4)
+        jobs = [asyncio.ensure_future(scheduler.render({'pdf': {'format': 'A4'}}, html='doc'))
+                for _ in range(3)]
+        await _settle()
+        assert pool.started == ['doc']
+        pool.release('doc')
+        assert await asyncio.gather(*jobs) == [b'doc'] * 3
+        assert not scheduler._inflight
+    asyncio.run(run())
+
+
+@pytest.mark.parametrize('args, kwargs', [
+    ({}, dict(output_file='doc.pdf')),
+    ({}, dict(out=bytearray())),
+    ({}, dict(variants=[{}])),
+    ({}, dict(returns=None)),
+    ({}, dict(html=b'doc')),
+    ({'pdf': {'path': 'doc.pdf'}}, {}),
+])
+def test_coalesce_disabled_by_outputs(args, kwargs):
+    async def run():
+        pool = FakePool()
+        scheduler = Scheduler(pool, capacity=4)
+        kwargs.setdefault('html', 'doc')
+        jobs = [asyncio.ensure_future(scheduler.render(args, **kwargs)) for _ in range(2)]
+        await _settle()
+        assert len(pool.started) == 2
+        pool.release(kwargs['html'])
+        await asyncio.gather(*jobs)
+    asyncio.run(run())
+
+
+def test_coalesce_only_within_priority_class():
+    async def run():
+        pool = FakePool()
+        scheduler = Scheduler(pool, capacity=4)
+        jobs = [asyncio.ensure_future(scheduler.render({}, priority=priority, html='doc'))
+                for priority in ('interactive', 'bulk', 'bulk')]
+        await _settle()
+        assert len(pool.started) == 2
+        pool.release('doc')
+        assert await asyncio.gather(*jobs) == [b'doc'] * 3
+    asyncio.run(run())
+
+
+def test_coalesced_waiter_cancellation():
+    async def run():
+        pool = FakePool()
+        scheduler = Scheduler(pool, capacity=4)
+        first = asyncio.ensure_future(scheduler.render({}, html='doc'))
+        second = asyncio.ensure_future(scheduler.render({}, html='doc'))
+        await _settle()
+        first.cancel()
+        await _settle()
+        assert first.cancelled()
+        pool.release('doc')
+        assert await second == b'doc'
+        assert pool.started == ['doc']
+        assert scheduler.running == 0
+    asyncio.run(run())